@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+BrainID Neural Authentication System
+Emit Latency Benchmark
+
+Measures how long eeg_data events take to reach a Socket.IO client under
+each concurrency model (BRAIN_AUTH_ASYNC_MODE). For every mode the server
+is started in its own process, since the green modes monkey-patch the
+interpreter. A simulated ESP32 (a minimal WebSocket server in this
+process) streams timestamped samples at --rate Hz; the server connects to
+it with its ESP32Client, so samples take the real ingest path through
+websocket-client's blocking socket loop and the emit queue while key jobs
+run every --key-interval seconds. A Socket.IO client records the delay
+between each sample's timestamp and its arrival:
+
+    python benchmark_emit_latency.py --modes threading,eventlet,gevent --seconds 10
+
+Modes whose package is not installed are skipped.
+"""
+
+import argparse
+import base64
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import websocket
+
+from eeg_concurrency import ASYNC_MODES
+
+logger = logging.getLogger(__name__)
+
+def parse_list(value):
+    """Parse a comma-separated command line list"""
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+class SimulatedESP32:
+    """WebSocket server sending timestamped samples like the ESP32 firmware"""
+
+    GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+    def __init__(self, rate, channels):
+        self.rate = rate
+        self.channels = channels
+        self.listener = socket.socket()
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen()
+        self.url = f"ws://127.0.0.1:{self.listener.getsockname()[1]}/ws"
+        threading.Thread(target=self.accept, daemon=True).start()
+
+    def accept(self):
+        while True:
+            conn, _ = self.listener.accept()
+            threading.Thread(target=self.stream, args=(conn,), daemon=True).start()
+
+    def handshake(self, conn):
+        request = b''
+        while b'\r\n\r\n' not in request:
+            chunk = conn.recv(4096)
+            if not chunk:
+                raise ConnectionError('Closed during handshake')
+            request += chunk
+        headers = dict(
+            line.split(': ', 1) for line in request.decode().split('\r\n')[1:] if ': ' in line
+        )
+        accept = base64.b64encode(hashlib.sha1((headers['Sec-WebSocket-Key'] + self.GUID).encode()).digest())
+        conn.sendall(
+            b'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+            b'Sec-WebSocket-Accept: ' + accept + b'\r\n\r\n'
+        )
+
+    @staticmethod
+    def frame(text):
+        """Unmasked, unfragmented text frame"""
+        payload = text.encode()
+        if len(payload) < 126:
+            header = struct.pack('!BB', 0x81, len(payload))
+        elif len(payload) < 65536:
+            header = struct.pack('!BBH', 0x81, 126, len(payload))
+        else:
+            header = struct.pack('!BBQ', 0x81, 127, len(payload))
+        return header + payload
+
+    def stream(self, conn):
+        rng = np.random.default_rng(0)
+        try:
+            self.handshake(conn)
+            next_sample = time.monotonic()
+            while True:
+                channels = [{'value': float(value)} for value in rng.normal(size=self.channels)]
+                conn.sendall(self.frame(json.dumps({'channels': channels, 'timestamp': time.time()})))
+                next_sample += 1.0 / self.rate
+                time.sleep(max(0.0, next_sample - time.monotonic()))
+        except (OSError, ConnectionError, KeyError):
+            pass
+        finally:
+            conn.close()
+
+def serve(args):
+    """Server process: connect to the simulated ESP32, run key jobs and serve"""
+    import brain_auth_server as server
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    session = server.create_device_session(
+        'benchmark', args.rate, args.processing_rate, num_channels=args.channels
+    )
+    server.sessions.add(session)
+    session.client = server.ESP32Client(args.esp32_url, session)
+
+    def key_jobs():
+        while True:
+            server.runtime.sleep(args.key_interval)
+            if not session.processor.get_buffer_status():
+                continue
+            if args.inline_keys:
+                # What a key request did before key jobs were moved off the hub
+                session.processor.generate_brain_key(None, args.consensus_windows)
+            else:
+                server.runtime.run_blocking(session.processor.generate_brain_key, None, args.consensus_windows)
+
+    session.start(session.client.connect, server.runtime)
+    if args.key_interval > 0:
+        server.runtime.spawn(key_jobs, name='benchmark-keys')
+    server.run_server(host='127.0.0.1', port=args.port)
+
+def connect(port, timeout=30.0):
+    """Socket.IO connection (Engine.IO v4 over a plain WebSocket) to the server"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            ws = websocket.create_connection(
+                f"ws://127.0.0.1:{port}/socket.io/?EIO=4&transport=websocket", timeout=5
+            )
+            break
+        except (OSError, websocket.WebSocketException):
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+    ws.recv()       # Engine.IO open packet
+    ws.send('40')   # Connect to the default namespace
+    return ws
+
+def measure(mode, args):
+    """Latency statistics (ms) of eeg_data events for one async mode"""
+    port = free_port()
+    esp32 = SimulatedESP32(args.rate, args.channels)
+    env = dict(
+        os.environ,
+        BRAIN_AUTH_ASYNC_MODE=mode,
+        BRAIN_AUTH_ALLOW_WERKZEUG='1',
+        BRAIN_AUTH_CHECKPOINT_INTERVAL='0',
+        BRAIN_AUTH_LOG_LEVEL='WARNING'
+    )
+    command = [
+        sys.executable, os.path.abspath(__file__), '--serve', '--port', str(port), '--esp32-url', esp32.url,
+        '--rate', str(args.rate), '--processing-rate', str(args.processing_rate), '--channels', str(args.channels),
+        '--key-interval', str(args.key_interval), '--consensus-windows', str(args.consensus_windows)
+    ] + (['--inline-keys'] if args.inline_keys else [])
+    server = subprocess.Popen(command, env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+    latencies = []
+    try:
+        ws = connect(port)
+        started = time.monotonic()
+        while time.monotonic() - started < args.warmup + args.seconds:
+            message = ws.recv()
+            received = time.time()
+            if message == '2':
+                ws.send('3')  # Engine.IO pong
+                continue
+            if not message.startswith('42'):
+                continue
+            event, data = json.loads(message[2:])[:2]
+            if event == 'eeg_data' and time.monotonic() - started >= args.warmup:
+                latencies.append((received - data['timestamp']) * 1000.0)
+        ws.close()
+    finally:
+        server.terminate()
+        server.wait()
+        esp32.listener.close()
+
+    latencies = np.array(latencies)
+    if not len(latencies):
+        return {'async_mode': mode, 'events': 0}
+    return {
+        'async_mode': mode,
+        'events': len(latencies),
+        'events_per_second': len(latencies) / args.seconds,
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'max_ms': float(latencies.max())
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Socket.IO emit latency per async mode')
+    parser.add_argument('--modes', default=','.join(ASYNC_MODES), help='Async modes to compare')
+    parser.add_argument('--seconds', type=float, default=10.0, help='Measurement time per mode')
+    parser.add_argument('--warmup', type=float, default=3.0, help='Seconds ignored while buffers fill')
+    parser.add_argument('--rate', type=float, default=100.0, help='Simulated ESP32 sample rate (Hz)')
+    parser.add_argument('--processing-rate', type=float, default=100.0, help='Session processing rate (Hz)')
+    parser.add_argument('--channels', type=int, default=8, help='Simulated channel count')
+    parser.add_argument('--key-interval', type=float, default=0.5,
+                        help='Seconds between background key jobs (0 disables)')
+    parser.add_argument('--consensus-windows', type=int, default=8, help='Consensus windows per key job')
+    parser.add_argument('--inline-keys', action='store_true',
+                        help='Run key jobs on the server thread instead of the runtime pool, for comparison')
+    parser.add_argument('--output', help='Write results to a .json file')
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--esp32-url', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    logging.basicConfig(level=logging.WARNING)
+
+    results = []
+    for mode in parse_list(args.modes):
+        if mode not in ASYNC_MODES:
+            logger.error("Unknown async mode %s", mode)
+            sys.exit(1)
+        if mode != 'threading' and importlib.util.find_spec(mode) is None:
+            logger.warning("Skipping %s: package not installed", mode)
+            continue
+        results.append(measure(mode, args))
+
+    print(f"{'mode':>10} {'events':>7} {'ev/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for r in results:
+        if not r['events']:
+            print(f"{r['async_mode']:>10} {0:>7}")
+            continue
+        print(f"{r['async_mode']:>10} {r['events']:>7} {r['events_per_second']:>7.1f} {r['p50_ms']:>8.2f} "
+              f"{r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['max_ms']:>8.2f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
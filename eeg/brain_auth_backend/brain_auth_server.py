@@ -1,454 +1,1460 @@
-import asyncio
-import json
-import time
-import hashlib
-import base64
-from collections import deque
-from threading import Lock, Thread
-import numpy as np
-from scipy import signal
-from scipy.fft import fft, fftfreq
-from flask import Flask, render_template, request, jsonify
-from flask_socketio import SocketIO, emit
-import websocket
-import logging
-
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-
-class BrainAuthProcessor:
-    def __init__(self, sample_rate=20, buffer_duration=2.0):  # 20Hz for good analysis
-        self.sample_rate = sample_rate
-        self.buffer_duration = buffer_duration
-        self.buffer_size = int(sample_rate * buffer_duration)  # 40 samples for 2 seconds at 20Hz
-        self.num_channels = 8
-        
-        # Frequency bands (Hz)
-        self.frequency_bands = {
-            'delta': (0.5, 4.0),
-            'theta': (4.0, 8.0),
-            'alpha': (8.0, 12.0),
-            'beta': (12.0, 30.0),
-            'gamma': (30.0, 50.0)
-        }
-        
-        # Data buffers for each channel
-        self.data_buffers = [deque(maxlen=self.buffer_size) for _ in range(self.num_channels)]
-        self.buffer_lock = Lock()
-        
-        # Authentication state
-        self.is_processing = False
-        self.last_key = None
-        self.key_history = deque(maxlen=10)  # Store last 10 keys for comparison
-        
-        # Tolerance settings
-        self.tolerance_percentage = 15.0
-        
-        logger.info(f"BrainAuth processor initialized: {self.buffer_size} samples, {self.num_channels} channels")
-
-    def add_sample(self, channel_data):
-        """Add a new sample to the buffers"""
-        with self.buffer_lock:
-            for i, value in enumerate(channel_data):
-                if i < self.num_channels:
-                    self.data_buffers[i].append(float(value))
-
-    def get_buffer_status(self):
-        """Check if buffers are full enough for processing"""
-        with self.buffer_lock:
-            return all(len(buffer) >= self.buffer_size for buffer in self.data_buffers)
-
-    def extract_frequency_bands(self, data, sampling_rate):
-        """Extract frequency bands from EEG data using bandpass filtering"""
-        bands = {}
-        
-        for band_name, (low_freq, high_freq) in self.frequency_bands.items():
-            # Design bandpass filter
-            nyquist = sampling_rate / 2
-            low = low_freq / nyquist
-            high = high_freq / nyquist
-            
-            try:
-                b, a = signal.butter(4, [low, high], btype='band')
-                filtered_data = signal.filtfilt(b, a, data)
-                bands[band_name] = filtered_data
-            except Exception as e:
-                logger.error(f"Error filtering band {band_name}: {e}")
-                bands[band_name] = data  # Fallback to original data
-                
-        return bands
-
-    def compute_fft_features(self, data):
-        """Compute FFT features for frequency analysis"""
-        # Compute FFT
-        fft_values = fft(data)
-        fft_freqs = fftfreq(len(data), 1/self.sample_rate)
-        
-        # Take magnitude of positive frequencies
-        positive_freqs = fft_freqs[:len(fft_freqs)//2]
-        fft_magnitude = np.abs(fft_values[:len(fft_values)//2])
-        
-        # Extract features
-        features = {
-            'mean_power': np.mean(fft_magnitude),
-            'peak_freq': positive_freqs[np.argmax(fft_magnitude)],
-            'peak_power': np.max(fft_magnitude),
-            'power_ratio': np.sum(fft_magnitude[:10]) / np.sum(fft_magnitude),  # Low/total power
-            'spectral_centroid': np.sum(positive_freqs * fft_magnitude) / np.sum(fft_magnitude),
-            'spectral_rolloff': self.compute_spectral_rolloff(positive_freqs, fft_magnitude),
-            'spectral_flux': np.sum(np.diff(fft_magnitude) ** 2)
-        }
-        
-        return features
-
-    def compute_spectral_rolloff(self, freqs, magnitude, rolloff_percent=0.85):
-        """Compute spectral rolloff frequency"""
-        total_power = np.sum(magnitude)
-        cumulative_power = np.cumsum(magnitude)
-        rolloff_idx = np.where(cumulative_power >= rolloff_percent * total_power)[0]
-        
-        if len(rolloff_idx) > 0:
-            return freqs[rolloff_idx[0]]
-        else:
-            return freqs[-1]
-
-    def generate_brain_key(self):
-        """Generate a consistent 2KB biometric key from current EEG data"""
-        if not self.get_buffer_status():
-            return None, "Insufficient data for key generation"
-        
-        try:
-            # Extract data from all buffers
-            all_features = []
-            
-            with self.buffer_lock:
-                for channel_idx in range(self.num_channels):
-                    channel_data = np.array(list(self.data_buffers[channel_idx]))
-                    
-                    # Extract frequency bands
-                    bands = self.extract_frequency_bands(channel_data, self.sample_rate)
-                    
-                    # Compute FFT features for each band
-                    for band_name, band_data in bands.items():
-                        features = self.compute_fft_features(band_data)
-                        
-                        # Normalize features for consistency
-                        feature_vector = [
-                            features['mean_power'],
-                            features['peak_freq'],
-                            features['peak_power'],
-                            features['power_ratio'],
-                            features['spectral_centroid'],
-                            features['spectral_rolloff'],
-                            features['spectral_flux']
-                        ]
-                        
-                        all_features.extend(feature_vector)
-            
-            # Convert to numpy array and normalize
-            feature_array = np.array(all_features)
-            feature_array = self.normalize_features(feature_array)
-            
-            # Apply tolerance by quantizing features
-            quantized_features = self.apply_tolerance(feature_array, self.tolerance_percentage)
-            
-            # Generate hash
-            brain_key = self.create_hash_key(quantized_features)
-            
-            # Store in history
-            self.key_history.append(brain_key)
-            self.last_key = brain_key
-            
-            logger.info(f"Generated brain key: {brain_key[:32]}... (length: {len(brain_key)})")
-            return brain_key, "Success"
-            
-        except Exception as e:
-            logger.error(f"Error generating brain key: {e}")
-            return None, f"Error: {str(e)}"
-
-    def normalize_features(self, features):
-        """Normalize features to ensure consistency"""
-        # Remove any NaN or infinite values
-        features = np.nan_to_num(features, nan=0.0, posinf=1e6, neginf=-1e6)
-        
-        # Z-score normalization
-        mean = np.mean(features)
-        std = np.std(features)
-        if std > 0:
-            features = (features - mean) / std
-        
-        return features
-
-    def apply_tolerance(self, features, tolerance_percent):
-        """Apply tolerance to features for consistent key generation"""
-        # Quantize features to create tolerance
-        scale_factor = 100.0 / tolerance_percent  # Higher values = less tolerance
-        quantized = np.round(features * scale_factor) / scale_factor
-        
-        return quantized
-
-    def create_hash_key(self, features):
-        """Create a 2KB hash key from features"""
-        # Convert features to bytes
-        feature_bytes = features.tobytes()
-        
-        # Create multiple hash layers for 2KB output
-        hash_layers = []
-        
-        # SHA-256 base hash
-        hash_layers.append(hashlib.sha256(feature_bytes).digest())
-        
-        # MD5 hash
-        hash_layers.append(hashlib.md5(feature_bytes).digest())
-        
-        # SHA-1 hash
-        hash_layers.append(hashlib.sha1(feature_bytes).digest())
-        
-        # SHA-512 hash (truncated)
-        hash_layers.append(hashlib.sha512(feature_bytes).digest()[:64])
-        
-        # BLAKE2b hash
-        hash_layers.append(hashlib.blake2b(feature_bytes, digest_size=32).digest())
-        
-        # Additional entropy from features
-        for i in range(0, len(features), 10):
-            chunk = features[i:i+10]
-            chunk_bytes = chunk.tobytes()
-            hash_layers.append(hashlib.sha256(chunk_bytes).digest())
-        
-        # Combine all hashes
-        combined_hash = b''.join(hash_layers)
-        
-        # Ensure exactly 2KB (2048 bytes)
-        if len(combined_hash) > 2048:
-            combined_hash = combined_hash[:2048]
-        elif len(combined_hash) < 2048:
-            # Pad with repeated hashing
-            while len(combined_hash) < 2048:
-                combined_hash += hashlib.sha256(combined_hash).digest()
-            combined_hash = combined_hash[:2048]
-        
-        # Convert to base64 for transmission
-        return base64.b64encode(combined_hash).decode('utf-8')
-
-    def get_key_consistency(self):
-        """Check consistency of recent keys"""
-        if len(self.key_history) < 2:
-            return 0.0
-        
-        # Compare recent keys
-        recent_keys = list(self.key_history)[-5:]  # Last 5 keys
-        consistency_count = 0
-        total_comparisons = 0
-        
-        for i in range(len(recent_keys)):
-            for j in range(i + 1, len(recent_keys)):
-                total_comparisons += 1
-                if recent_keys[i] == recent_keys[j]:
-                    consistency_count += 1
-        
-        return (consistency_count / total_comparisons) * 100 if total_comparisons > 0 else 0.0
-
-# Flask application
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'brain_auth_secret_key'
-socketio = SocketIO(app, cors_allowed_origins="*")
-
-# Global processor instance
-processor = BrainAuthProcessor()
-
-# ESP32 WebSocket client
-class ESP32Client:
-    def __init__(self, esp32_url):
-        self.esp32_url = esp32_url
-        self.ws = None
-        self.connected = False
-        
-    def connect(self):
-        """Connect to ESP32 WebSocket"""
-        try:
-            self.ws = websocket.WebSocketApp(
-                self.esp32_url,
-                on_open=self.on_open,
-                on_message=self.on_message,
-                on_error=self.on_error,
-                on_close=self.on_close
-            )
-            
-            # Start connection in a separate thread
-            self.ws.run_forever()
-            
-        except Exception as e:
-            logger.error(f"ESP32 connection error: {e}")
-            
-    def on_open(self, ws):
-        self.connected = True
-        logger.info("Connected to ESP32")
-        socketio.emit('esp32_status', {'status': 'connected'})
-        
-    def on_message(self, ws, message):
-        try:
-            # Log the raw message for debugging
-            logger.info(f"Raw message received: {message[:200]}...")  # First 200 chars
-            
-            data = json.loads(message)
-            logger.info(f"Parsed JSON keys: {list(data.keys())}")
-            
-            if 'channels' in data:
-                logger.info(f"=== DETAILED CHANNEL DEBUG ===")
-                logger.info(f"Channels array length: {len(data['channels'])}")
-                
-                # Log ALL channels received
-                for i, channel in enumerate(data['channels']):
-                    logger.info(f"Channel {i}: {channel}")
-                
-                # Extract channel values with error handling
-                channel_values = []
-                for i, channel in enumerate(data['channels']):
-                    if isinstance(channel, dict) and 'value' in channel:
-                        try:
-                            value = float(channel['value'])
-                            channel_values.append(value)
-                            logger.info(f"Successfully extracted channel {i}: {value}")
-                        except (ValueError, TypeError) as e:
-                            logger.error(f"Invalid value in channel {i}: {channel.get('value', 'MISSING')} - {e}")
-                            channel_values.append(0.0)  # Default fallback
-                    else:
-                        logger.error(f"Channel {i} missing 'value' key or not dict: {channel}")
-                        channel_values.append(0.0)  # Default fallback
-                
-                logger.info(f"Total channel values extracted: {len(channel_values)}")
-                logger.info(f"Channel values: {channel_values}")
-                logger.info(f"==============================")
-                
-                if len(channel_values) == 8:  # Only process if we have all 8 channels
-                    # Add to processor
-                    processor.add_sample(channel_values)
-                    
-                    # Emit to web clients
-                    socketio.emit('eeg_data', {
-                        'channels': channel_values,
-                        'timestamp': data.get('timestamp', time.time()),
-                        'buffer_ready': processor.get_buffer_status()
-                    })
-                    
-                    # Log success occasionally
-                    if hasattr(self, '_message_count'):
-                        self._message_count += 1
-                    else:
-                        self._message_count = 1
-                        
-                    if self._message_count % 50 == 0:  # Every 50 messages
-                        logger.info(f"Successfully processed {self._message_count} messages")
-                else:
-                    logger.error(f"❌ CHANNEL COUNT MISMATCH: Expected 8 channels, got {len(channel_values)}")
-                    logger.error(f"❌ This means {8 - len(channel_values)} channels are missing!")
-            else:
-                logger.error(f"No 'channels' key in message. Available keys: {list(data.keys())}")
-                
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON decode error: {e} - Raw message: {message[:100]}...")
-        except Exception as e:
-            logger.error(f"Error processing ESP32 message: {e}")
-            logger.error(f"Message content: {message[:200]}...")
-            import traceback
-            logger.error(f"Full traceback: {traceback.format_exc()}")
-            
-    def on_error(self, ws, error):
-        logger.error(f"ESP32 WebSocket error: {error}")
-        self.connected = False
-        socketio.emit('esp32_status', {'status': 'error', 'message': str(error)})
-        
-    def on_close(self, ws, close_status_code, close_msg):
-        self.connected = False
-        logger.info("ESP32 connection closed")
-        socketio.emit('esp32_status', {'status': 'disconnected'})
-
-# Global ESP32 client
-esp32_client = None
-
-@app.route('/')
-def index():
-    return render_template('index.html')
-
-@app.route('/api/connect_esp32', methods=['POST'])
-def connect_esp32():
-    global esp32_client
-    
-    data = request.json
-    esp32_ip = data.get('esp32_ip', '192.168.1.100')
-    esp32_url = f"ws://{esp32_ip}/ws"
-    
-    try:
-        esp32_client = ESP32Client(esp32_url)
-        
-        # Start connection in background thread
-        thread = Thread(target=esp32_client.connect)
-        thread.daemon = True
-        thread.start()
-        
-        return jsonify({'status': 'connecting', 'url': esp32_url})
-        
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)})
-
-@app.route('/api/generate_key', methods=['POST'])
-def generate_key():
-    if not processor.get_buffer_status():
-        return jsonify({
-            'status': 'error',
-            'message': 'Insufficient data. Need 2 seconds of EEG data.'
-        })
-    
-    try:
-        processor.is_processing = True
-        brain_key, message = processor.generate_brain_key()
-        
-        if brain_key:
-            consistency = processor.get_key_consistency()
-            
-            return jsonify({
-                'status': 'success',
-                'brain_key': brain_key,
-                'key_length': len(brain_key),
-                'consistency': consistency,
-                'message': message,
-                'timestamp': time.time()
-            })
-        else:
-            return jsonify({
-                'status': 'error',
-                'message': message
-            })
-            
-    except Exception as e:
-        return jsonify({
-            'status': 'error',
-            'message': str(e)
-        })
-    finally:
-        processor.is_processing = False
-
-@app.route('/api/status', methods=['GET'])
-def get_status():
-    return jsonify({
-        'buffer_ready': processor.get_buffer_status(),
-        'is_processing': processor.is_processing,
-        'esp32_connected': esp32_client.connected if esp32_client else False,
-        'key_history_count': len(processor.key_history),
-        'last_key_preview': processor.last_key[:32] + '...' if processor.last_key else None
-    })
-
-@socketio.on('connect')
-def handle_connect():
-    logger.info('Client connected to WebSocket')
-    emit('status', {'message': 'Connected to BrainAuth server'})
-
-@socketio.on('disconnect')
-def handle_disconnect():
-    logger.info('Client disconnected from WebSocket')
-
-if __name__ == '__main__':
-    logger.info("Starting BrainAuth server...")
-    socketio.run(app, host='0.0.0.0', port=5000, debug=True) 
\ No newline at end of file
+# Choose the concurrency model before anything opens a socket: the green
+# modes monkey-patch sockets, time and select (see eeg_concurrency.py)
+from eeg_concurrency import AsyncRuntime, configure_async_mode
+ASYNC_MODE = configure_async_mode()
+
+import asyncio
+import json
+import hmac
+import time
+import zlib
+import io
+import os
+import atexit
+import cProfile
+import pstats
+import tracemalloc
+import itertools
+import sys
+from collections import deque
+import threading
+from threading import Lock
+import numpy as np
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
+from flask_socketio import SocketIO, emit, join_room, leave_room
+from werkzeug.serving import WSGIRequestHandler
+import websocket
+import logging
+from eeg_sessions import (
+    DeviceSession, LeakChecker, MemoryBudgetExceeded, SessionManager, container_bytes
+)
+from eeg_resampling import StreamingResampler
+from eeg_band_power import BandPowerPublisher, band_power_room
+from eeg_checkpoint import SessionCheckpointer
+from eeg_deadline import AdmissionRejected, KeyScheduler
+from eeg_enrollment import Enrollment, TemplateStore
+from eeg_logging import configure_logging
+from eeg_pipeline import (
+    BAND_POWER_STAGES, DEFAULT_FREQUENCY_BANDS, FEATURE_STAGES, KEY_STAGES, SPECTRAL_MODES,
+    PipelineConfig, apply_tolerance, compile_plan, create_hash_key, set_dsp_threads
+)
+from eeg_recording import (
+    EXPORT_FORMATS, SessionRecorder, arrow_available, list_recordings, open_recording, safe_name, stream_export
+)
+
+# Configure logging: records are written by a background thread, and typed
+# high-frequency messages are rate limited (see eeg_logging.py)
+log_control = configure_logging(
+    level=os.environ.get('BRAIN_AUTH_LOG_LEVEL', 'INFO'),
+    log_file=os.environ.get('BRAIN_AUTH_LOG_FILE'),
+    queue_size=int(os.environ.get('BRAIN_AUTH_LOG_QUEUE', 10000)),
+    default_rate=float(os.environ.get('BRAIN_AUTH_LOG_RATE', 10))
+)
+logger = logging.getLogger(__name__)
+
+def _mark_stage(timings, stage, started):
+    """Record the duration of a stage in ms and return the next start time"""
+    timings[stage] = (time.perf_counter() - started) * 1000.0
+    return time.perf_counter()
+
+# Approximate bytes per buffered sample (deque slot + float object) and per stored key
+SAMPLE_BYTES = 8 + sys.getsizeof(0.0)
+KEY_BYTES = sys.getsizeof('k' * 2732)  # 2KB key, base64-encoded
+
+# How per-window features are combined in consensus key generation
+CONSENSUS_METHODS = ('median', 'vote')
+
+# Most windows a consensus key request may ask for
+MAX_CONSENSUS_WINDOWS = 64
+
+# Largest montage a session may declare
+MAX_CHANNELS = 256
+
+def default_montage(num_channels):
+    """Channel labels used when a session does not name its electrodes"""
+    return [f"ch{i}" for i in range(num_channels)]
+
+class BrainAuthProcessor:
+    def __init__(self, sample_rate=20, buffer_duration=2.0, spectral_mode='fft', consensus_duration=None,
+                 num_channels=8, montage=None):  # 20Hz for good analysis
+        if spectral_mode not in SPECTRAL_MODES:
+            raise ValueError(f"Unknown spectral mode: {spectral_mode}")
+        if montage is not None and len(montage) != num_channels:
+            raise ValueError(f"Montage names {len(montage)} channels, expected {num_channels}")
+        self.sample_rate = sample_rate
+        self.buffer_duration = buffer_duration
+        self.buffer_size = int(sample_rate * buffer_duration)  # 40 samples for 2 seconds at 20Hz
+        self.num_channels = num_channels
+        self.montage = list(montage) if montage is not None else default_montage(num_channels)
+        self.spectral_mode = spectral_mode
+        
+        # Longer history used by multi-window consensus keys
+        self.consensus_duration = consensus_duration or 2 * buffer_duration
+        self.consensus_size = max(self.buffer_size, int(sample_rate * self.consensus_duration))
+        # Distinct window positions in the consensus buffer, the most windows a key can use
+        self.max_consensus_windows = self.consensus_size - self.buffer_size + 1
+        
+        # Frequency bands (Hz)
+        self.frequency_bands = dict(DEFAULT_FREQUENCY_BANDS)
+        
+        # Data buffers for each channel
+        self.data_buffers = [deque(maxlen=self.consensus_size) for _ in range(self.num_channels)]
+        self.buffer_lock = Lock()
+        self.sample_seq = 0  # Sequence number of the most recent sample
+        
+        # Authentication state
+        self.is_processing = False
+        self.last_key = None
+        self.last_key_time = None
+        self.key_history = deque(maxlen=10)  # Store last 10 keys for comparison
+        
+        # Tolerance settings
+        self.tolerance_percentage = 15.0
+        
+        logger.info(f"BrainAuth processor initialized: {self.buffer_size} samples, {self.num_channels} channels")
+
+    def add_sample(self, channel_data):
+        """Add a new sample to the buffers"""
+        with self.buffer_lock:
+            for i, value in enumerate(channel_data):
+                if i < self.num_channels:
+                    self.data_buffers[i].append(float(value))
+            self.sample_seq += 1
+
+    def add_samples(self, samples):
+        """Add an (n_samples, num_channels) block to the buffers"""
+        samples = np.asarray(samples, dtype=float).reshape(len(samples), -1)
+        with self.buffer_lock:
+            for i in range(min(self.num_channels, samples.shape[1])):
+                self.data_buffers[i].extend(samples[:, i].tolist())
+            self.sample_seq += len(samples)
+
+    def get_buffer_status(self):
+        """Check if buffers are full enough for processing"""
+        with self.buffer_lock:
+            return all(len(buffer) >= self.buffer_size for buffer in self.data_buffers)
+
+    def memory_usage(self):
+        """Approximate bytes used now and once buffers and key history are full"""
+        with self.buffer_lock:
+            buffer_bytes = sum(container_bytes(buffer, sys.getsizeof(0.0)) for buffer in self.data_buffers)
+        key_history_bytes = container_bytes(self.key_history, KEY_BYTES)
+        capacity_bytes = (
+            self.num_channels * (sys.getsizeof(deque()) + self.consensus_size * SAMPLE_BYTES)
+            + sys.getsizeof(deque()) + self.key_history.maxlen * (8 + KEY_BYTES)
+        )
+        return {
+            'buffer_bytes': buffer_bytes,
+            'key_history_bytes': key_history_bytes,
+            'used_bytes': buffer_bytes + key_history_bytes,
+            'capacity_bytes': max(capacity_bytes, buffer_bytes + key_history_bytes)
+        }
+
+    def get_samples_since(self, last_seq=None):
+        """Return (first_seq, samples) for samples newer than last_seq.
+
+        samples has shape (n_samples, num_channels). When last_seq is None or
+        older than the buffered window, the whole buffer is returned.
+        """
+        with self.buffer_lock:
+            available = min(len(buffer) for buffer in self.data_buffers)
+            oldest_seq = self.sample_seq - available + 1
+            if last_seq is None or last_seq + 1 < oldest_seq or last_seq > self.sample_seq:
+                count = available
+            else:
+                count = self.sample_seq - last_seq
+            samples = np.empty((count, self.num_channels))
+            if count:
+                for i, buffer in enumerate(self.data_buffers):
+                    samples[:, i] = list(buffer)[-count:]
+            return self.sample_seq - count + 1, samples
+
+    def checkpoint_state(self, buffers):
+        """Copy the channel buffers into buffers and return the metadata to restore them
+
+        buffers must have shape (num_channels, consensus_size); channel i's
+        samples fill buffers[i, :lengths[i]].
+        """
+        with self.buffer_lock:
+            lengths = [len(buffer) for buffer in self.data_buffers]
+            for i, buffer in enumerate(self.data_buffers):
+                buffers[i, :lengths[i]] = np.fromiter(buffer, dtype=float, count=lengths[i])
+            sample_seq = self.sample_seq
+        return {
+            'sample_rate': self.sample_rate,
+            'buffer_duration': self.buffer_duration,
+            'consensus_duration': self.consensus_duration,
+            'spectral_mode': self.spectral_mode,
+            'num_channels': self.num_channels,
+            'montage': self.montage,
+            'tolerance_percentage': self.tolerance_percentage,
+            'sample_seq': sample_seq,
+            'lengths': lengths,
+            'key_history': list(self.key_history),
+            'last_key': self.last_key,
+            'last_key_time': self.last_key_time
+        }
+
+    def restore_checkpoint(self, state, buffers):
+        """Refill buffers, key history and tolerance from checkpoint_state output
+
+        Raises ValueError if the checkpoint was taken with a different
+        channel count, sample rate or buffer length, whose samples would be
+        misread or truncated.
+        """
+        if state['num_channels'] != self.num_channels:
+            raise ValueError(f"Checkpoint has {state['num_channels']} channels, processor has {self.num_channels}")
+        if state['sample_rate'] != self.sample_rate:
+            raise ValueError(f"Checkpoint was taken at {state['sample_rate']} Hz, processor runs at {self.sample_rate} Hz")
+        if buffers.shape[-1] != self.consensus_size:
+            raise ValueError(
+                f"Checkpoint holds {buffers.shape[-1]} samples per channel, processor keeps {self.consensus_size}"
+            )
+        with self.buffer_lock:
+            for buffer, samples, length in zip(self.data_buffers, buffers, state['lengths']):
+                buffer.clear()
+                buffer.extend(samples[:length].tolist())
+            self.sample_seq = state['sample_seq']
+        self.key_history.clear()
+        self.key_history.extend(state['key_history'])
+        self.last_key = state['last_key']
+        self.last_key_time = state['last_key_time']
+        self.tolerance_percentage = state['tolerance_percentage']
+
+    def template_config(self):
+        """Settings a UserTemplate's features depend on, as JSON-compatible values"""
+        return {
+            'sample_rate': self.sample_rate,
+            'num_channels': self.num_channels,
+            'buffer_size': self.buffer_size,
+            'spectral_mode': self.spectral_mode,
+            'frequency_bands': {name: list(band) for name, band in self.frequency_bands.items()}
+        }
+
+    def pipeline_config(self):
+        """PipelineConfig matching the processor's current settings"""
+        return PipelineConfig(
+            self.sample_rate,
+            self.num_channels,
+            frequency_bands=self.frequency_bands,
+            spectral_mode=self.spectral_mode,
+            tolerance_percentage=self.tolerance_percentage
+        )
+
+    def take_snapshot(self, n_samples):
+        """Copy the newest n_samples of every channel into a (channels, samples) array"""
+        with self.buffer_lock:
+            snapshot = np.empty((self.num_channels, n_samples))
+            for channel_idx, buffer in enumerate(self.data_buffers):
+                snapshot[channel_idx] = list(itertools.islice(buffer, len(buffer) - n_samples, None))
+        return snapshot
+
+    def band_powers(self, n_samples=None, timings=None):
+        """(num_channels, bands) mean power of the newest n_samples in each band
+
+        Returns None until every channel holds n_samples (default: the key
+        window). Runs the filter and band_power pipeline stages.
+        """
+        n_samples = n_samples or self.buffer_size
+        with self.buffer_lock:
+            if any(len(buffer) < n_samples for buffer in self.data_buffers):
+                return None
+        channels = self.take_snapshot(n_samples)
+        plan = compile_plan(self.pipeline_config(), BAND_POWER_STAGES, channels.shape)
+        return plan.run(channels, timings)
+
+    def generate_brain_key(self, timings=None, consensus_windows=1, consensus='median', template=None):
+        """Generate a consistent 2KB biometric key from current EEG data
+
+        If a timings dict is passed, it is filled with the wall-clock
+        duration (ms) of each processing stage. With consensus_windows > 1,
+        the key is derived from that many overlapping windows spread over
+        the consensus buffer (see generate_consensus_features), at most
+        max_consensus_windows. With a
+        UserTemplate (see eeg_enrollment.py), features are quantized by the
+        template's per-feature widths instead of tolerance_percentage.
+        """
+        consensus_windows = min(max(1, int(consensus_windows)), self.max_consensus_windows)
+        n_samples = self.consensus_size if consensus_windows > 1 else self.buffer_size
+        
+        if not self.get_buffer_status():
+            return None, "Insufficient data for key generation"
+        with self.buffer_lock:
+            if any(len(buffer) < n_samples for buffer in self.data_buffers):
+                return None, f"Insufficient data for consensus key generation (need {self.consensus_duration} seconds)"
+        
+        if timings is None:
+            timings = {}
+        
+        try:
+            if template is not None:
+                template.check_config(self.template_config())
+            started = time.perf_counter()
+            
+            # Snapshot all buffers so DSP runs without holding the lock
+            channels = self.take_snapshot(n_samples)
+            started = _mark_stage(timings, 'snapshot', started)
+            
+            if consensus_windows > 1:
+                quantized_features = self.generate_consensus_features(
+                    channels, consensus_windows, consensus, timings, template
+                )
+                started = time.perf_counter()
+                
+                # Generate hash
+                brain_key = create_hash_key(quantized_features)
+                _mark_stage(timings, 'hashing', started)
+            elif template is not None:
+                feature_array = self.extract_features(channels, timings)
+                started = time.perf_counter()
+                quantized_features = template.quantize(feature_array)
+                started = _mark_stage(timings, 'quantization', started)
+                
+                # Generate hash
+                brain_key = create_hash_key(quantized_features)
+                _mark_stage(timings, 'hashing', started)
+            else:
+                # filter -> features -> normalize -> quantize -> hash
+                plan = compile_plan(self.pipeline_config(), KEY_STAGES, channels.shape)
+                brain_key = plan.run(channels, timings)
+            
+            # Store in history (template keys are per user, so they are neither
+            # compared with the device's keys nor served as its cached key)
+            if template is None:
+                self.key_history.append(brain_key)
+                self.last_key = brain_key
+                self.last_key_time = time.time()
+            
+            logger.info(f"Generated brain key: {brain_key[:32]}... (length: {len(brain_key)})")
+            return brain_key, "Success"
+            
+        except Exception as e:
+            logger.error(f"Error generating brain key: {e}")
+            return None, f"Error: {str(e)}"
+
+    def generate_consensus_features(self, channels, consensus_windows, consensus='median', timings=None, template=None):
+        """Quantized consensus features over overlapping windows of channels
+
+        channels has shape (num_channels, n_samples) with n_samples -
+        buffer_size >= K - 1. The windows are evenly spaced, the last one
+        ending at the newest sample, and are a strided view into channels;
+        all K feature vectors come out of one batched
+        extract_features call, and they are combined per feature by median
+        (before quantization) or majority vote (after quantization).
+        """
+        if consensus not in CONSENSUS_METHODS:
+            raise ValueError(f"Unknown consensus method: {consensus}")
+        if timings is None:
+            timings = {}
+        
+        span = channels.shape[-1] - self.buffer_size
+        if consensus_windows - 1 > span:
+            raise ValueError(f"{consensus_windows} windows do not fit in {channels.shape[-1]} samples")
+        step = span // (consensus_windows - 1)
+        first = span - step * (consensus_windows - 1)
+        # (num_channels, K, buffer_size) view, no copy
+        windows = np.lib.stride_tricks.sliding_window_view(channels, self.buffer_size, axis=-1)[:, first::step]
+        
+        window_features = self.extract_features(windows, timings)
+        started = time.perf_counter()
+        
+        if template is not None:
+            quantize = template.quantize
+        else:
+            quantize = lambda features: self.apply_tolerance(features, self.tolerance_percentage)
+        
+        if consensus == 'median':
+            quantized = quantize(np.median(window_features, axis=0))
+        else:
+            window_quantized = quantize(window_features)
+            # Count, for every window, how many windows share its value; keep the most common
+            votes = np.sum(window_quantized[:, None, :] == window_quantized[None, :, :], axis=1)
+            quantized = window_quantized[np.argmax(votes, axis=0), np.arange(window_quantized.shape[1])]
+        
+        _mark_stage(timings, 'quantization', started)
+        return quantized
+
+    def extract_features(self, channels, timings=None):
+        """Compute the normalized feature vector for an array of channels
+
+        channels has shape (num_channels, n_samples) for a single window or
+        (num_channels, K, n_samples) for K windows, giving a feature vector
+        of shape (features,) or (K, features). This is everything in key
+        generation that does not depend on the tolerance, so callers
+        evaluating several tolerances can reuse it.
+        """
+        channels = np.asarray(channels, dtype=float)
+        plan = compile_plan(self.pipeline_config(), FEATURE_STAGES, channels.shape)
+        return plan.run(channels, timings)
+
+    def apply_tolerance(self, features, tolerance_percent):
+        """Apply tolerance to features for consistent key generation"""
+        return apply_tolerance(features, tolerance_percent)
+
+    def create_hash_key(self, features):
+        """Create a 2KB hash key from features"""
+        return create_hash_key(features)
+
+    def get_key_consistency(self):
+        """Check consistency of recent keys"""
+        if len(self.key_history) < 2:
+            return 0.0
+        
+        # Compare recent keys
+        recent_keys = list(self.key_history)[-5:]  # Last 5 keys
+        consistency_count = 0
+        total_comparisons = 0
+        
+        for i in range(len(recent_keys)):
+            for j in range(i + 1, len(recent_keys)):
+                total_comparisons += 1
+                if recent_keys[i] == recent_keys[j]:
+                    consistency_count += 1
+        
+        return (consistency_count / total_comparisons) * 100 if total_comparisons > 0 else 0.0
+
+def encode_sample_block(samples, resolution=0.01):
+    """Delta/zigzag encode a (n_samples, n_channels) block and zlib-compress it.
+
+    Values are quantized to multiples of resolution, differenced along time
+    per channel (the first row against zero), zigzag-mapped to unsigned
+    integers and stored in the narrowest dtype that fits.
+    """
+    quantized = np.round(np.asarray(samples) / resolution).astype(np.int64)
+    deltas = np.diff(quantized, axis=0, prepend=0)
+    zigzag = ((deltas << 1) ^ (deltas >> 63)).astype(np.uint64)
+
+    max_value = int(zigzag.max()) if zigzag.size else 0
+    for dtype in (np.uint8, np.uint16, np.uint32, np.uint64):
+        if max_value <= np.iinfo(dtype).max:
+            break
+
+    payload = zlib.compress(zigzag.astype(dtype).tobytes())
+    return {
+        'shape': list(zigzag.shape),
+        'dtype': np.dtype(dtype).name,
+        'resolution': resolution,
+        'data': payload
+    }
+
+def decode_sample_block(block):
+    """Inverse of encode_sample_block, returning float samples"""
+    zigzag = np.frombuffer(zlib.decompress(block['data']), dtype=block['dtype'])
+    zigzag = zigzag.astype(np.int64).reshape(block['shape'])
+    deltas = (zigzag >> 1) ^ -(zigzag & 1)
+    return np.cumsum(deltas, axis=0) * block['resolution']
+
+class KeyProfiler:
+    """Samples cProfile/tracemalloc data for the next N key generations"""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.reset(0, False)
+
+    def reset(self, requests, trace_memory):
+        self.remaining = requests
+        self.trace_memory = trace_memory
+        self.profiled = 0
+        self.stats = None
+        self.peak_memory = []
+        self.allocations = {}
+
+    def arm(self, requests, trace_memory=False):
+        """Profile the next `requests` key generations, discarding old stats"""
+        with self.lock:
+            self.reset(requests, trace_memory)
+
+    def run(self, func, *args, **kwargs):
+        """Call func, profiling it if the profiler is armed"""
+        with self.lock:
+            armed = self.remaining > 0
+            if armed:
+                self.remaining -= 1
+        if not armed:
+            return func(*args, **kwargs)
+
+        # Only one profiler can be active per interpreter
+        with self.lock:
+            profile = cProfile.Profile()
+            # Leave tracemalloc alone if something else (the leak checker) is tracing
+            owns_tracing = self.trace_memory and not tracemalloc.is_tracing()
+            if owns_tracing:
+                tracemalloc.start()
+            elif self.trace_memory:
+                tracemalloc.reset_peak()
+            try:
+                return profile.runcall(func, *args, **kwargs)
+            finally:
+                if self.trace_memory:
+                    snapshot = tracemalloc.take_snapshot()
+                    self.peak_memory.append(tracemalloc.get_traced_memory()[1])
+                    if owns_tracing:
+                        tracemalloc.stop()
+                    for stat in snapshot.statistics('lineno')[:20]:
+                        location = str(stat.traceback)
+                        self.allocations[location] = self.allocations.get(location, 0) + stat.size
+                if self.stats is None:
+                    self.stats = pstats.Stats(profile)
+                else:
+                    self.stats.add(profile)
+                self.profiled += 1
+
+    def report(self, limit=25):
+        """Aggregated stats for all profiled calls"""
+        with self.lock:
+            report = {
+                'profiled_requests': self.profiled,
+                'remaining_requests': self.remaining,
+                'trace_memory': self.trace_memory
+            }
+            if self.stats is not None:
+                output = io.StringIO()
+                self.stats.stream = output
+                self.stats.sort_stats('cumulative').print_stats(limit)
+                report['cprofile'] = output.getvalue()
+            if self.peak_memory:
+                report['peak_memory_bytes'] = {
+                    'max': max(self.peak_memory),
+                    'mean': sum(self.peak_memory) / len(self.peak_memory)
+                }
+                top = sorted(self.allocations.items(), key=lambda item: item[1], reverse=True)[:limit]
+                report['top_allocations'] = [{'location': location, 'bytes': size} for location, size in top]
+            return report
+
+# Largest accepted (decompressed) /api/samples body
+MAX_UPLOAD_BYTES = int(float(os.environ.get('BRAIN_AUTH_MAX_UPLOAD_MB', 64)) * 1024 * 1024)
+
+# dtypes accepted for raw binary sample uploads
+UPLOAD_DTYPES = {'float32': '<f4', 'float64': '<f8', 'int16': '<i2', 'int32': '<i4'}
+
+def parse_sample_upload(body, content_type, headers):
+    """Decode an /api/samples body into an (n_samples, n_channels) array
+
+    Accepted bodies: .npy (application/x-npy, or any body starting with the
+    npy magic), raw little-endian samples (application/octet-stream) shaped
+    by an X-Sample-Shape: n,c or X-Channels: c header with an optional
+    X-Sample-Dtype, and JSON {"samples": [[...], ...]}.
+    """
+    if content_type == 'application/x-npy' or body[:6] == b'\x93NUMPY':
+        samples = np.load(io.BytesIO(body), allow_pickle=False)
+    elif content_type == 'application/json':
+        samples = np.asarray(json.loads(body)['samples'], dtype=float)
+    else:
+        dtype = UPLOAD_DTYPES.get(headers.get('X-Sample-Dtype', 'float32'))
+        if dtype is None:
+            raise ValueError(f"X-Sample-Dtype must be one of {', '.join(UPLOAD_DTYPES)}")
+        samples = np.frombuffer(body, dtype=dtype)
+        if 'X-Sample-Shape' in headers:
+            shape = tuple(int(dim) for dim in headers['X-Sample-Shape'].split(','))
+        elif 'X-Channels' in headers:
+            shape = (-1, int(headers['X-Channels']))
+        else:
+            raise ValueError('Raw uploads need an X-Sample-Shape or X-Channels header')
+        samples = samples.reshape(shape)
+    
+    if samples.ndim != 2:
+        raise ValueError(f"Expected a 2-D (samples, channels) array, got shape {samples.shape}")
+    if samples.dtype.kind not in 'biuf':
+        raise ValueError(f"Samples must be numeric, got dtype {samples.dtype}")
+    if not np.isfinite(samples).all():
+        # One NaN spreads over the whole window through the filters
+        raise ValueError('Samples must be finite (no NaN or inf)')
+    return samples
+
+def decompress_upload(body, encoding):
+    """Undo gzip/deflate Content-Encoding, refusing bodies over MAX_UPLOAD_BYTES"""
+    if encoding in ('', 'identity'):
+        return body
+    if encoding not in ('gzip', 'deflate'):
+        raise ValueError(f"Unsupported Content-Encoding: {encoding}")
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS if encoding == 'gzip' else zlib.MAX_WBITS)
+    data = decompressor.decompress(body, MAX_UPLOAD_BYTES + 1)
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise ValueError('Decompressed body too large')
+    return data
+
+# Flask application
+app = Flask(__name__)
+app.config['SECRET_KEY'] = 'brain_auth_secret_key'
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES
+
+# Keep HTTP connections alive for clients that push many sample blocks
+WSGIRequestHandler.protocol_version = 'HTTP/1.1'
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=ASYNC_MODE)
+
+# Ingest tasks, key jobs and emits all run on ASYNC_MODE; events from any
+# thread go through the runtime's emit queue
+runtime = AsyncRuntime(
+    socketio,
+    ASYNC_MODE,
+    emit_queue_size=int(os.environ.get('BRAIN_AUTH_EMIT_QUEUE', 10000)),
+    poll_interval=float(os.environ.get('BRAIN_AUTH_EMIT_POLL_MS', 5)) / 1000.0
+)
+runtime.start()
+
+# Default processor, used until a device connects
+processor = BrainAuthProcessor(num_channels=int(os.environ.get('BRAIN_AUTH_NUM_CHANNELS', 8)))
+
+# Threads the filter and feature stages split channel blocks across
+set_dsp_threads(int(os.environ.get('BRAIN_AUTH_DSP_THREADS', min(4, os.cpu_count() or 1))))
+
+# Device sessions under a global memory budget (0 = unlimited)
+sessions = SessionManager(
+    budget_bytes=int(float(os.environ.get('BRAIN_AUTH_MEMORY_BUDGET_MB', 0)) * 1024 * 1024),
+    policy=os.environ.get('BRAIN_AUTH_BUDGET_POLICY', 'evict')
+)
+sessions.add(DeviceSession('default', processor, pinned=True))
+
+# tracemalloc-based leak checking for soak tests
+leak_checker = LeakChecker()
+if os.environ.get('BRAIN_AUTH_LEAK_CHECK'):
+    leak_checker.start()
+
+# Sampled profiling of key generation, armed through /api/admin/profile
+key_profiler = KeyProfiler()
+
+# Stage cost model, admission control and deadline handling for key requests
+key_scheduler = KeyScheduler(
+    default_deadline_ms=float(os.environ.get('BRAIN_AUTH_KEY_DEADLINE_MS', 0)),
+    max_cached_age_ms=float(os.environ.get('BRAIN_AUTH_KEY_MAX_AGE_MS', 10000))
+)
+
+# Last sample sequence number sent to each Socket.IO client, by sid then device
+client_sample_seq = {}
+
+# Socket.IO room receiving the raw eeg_data stream; clients join it on connect
+# and may leave it when they subscribe to band powers instead
+RAW_STREAM_ROOM = 'eeg_raw'
+
+# Server-side band powers for dashboards, on a fixed hop
+band_power_publisher = BandPowerPublisher(
+    runtime,
+    sessions,
+    hop_hz=float(os.environ.get('BRAIN_AUTH_BAND_POWER_HZ', 4)),
+    window_seconds=float(os.environ['BRAIN_AUTH_BAND_POWER_WINDOW']) if os.environ.get('BRAIN_AUTH_BAND_POWER_WINDOW') else None
+)
+
+# Rate the ESP32 firmware streams at (SAMPLE_RATE_HZ in eeg_config.h); devices
+# are resampled to their session's processing rate on ingest
+DEVICE_SAMPLE_RATE = float(os.environ.get('BRAIN_AUTH_DEVICE_RATE', 100))
+
+# Where recorded sessions are written (see eeg_recording.py)
+RECORDING_DIR = os.environ.get('BRAIN_AUTH_RECORDING_DIR', 'recordings')
+
+# ESP32 WebSocket client
+class ESP32Client:
+    def __init__(self, esp32_url, session):
+        self.esp32_url = esp32_url
+        self.session = session
+        self.ws = None
+        self.connected = False
+        self.closing = False  # Set when the session is replaced or evicted
+        
+    def connect(self):
+        """Connect to ESP32 WebSocket"""
+        try:
+            self.ws = websocket.WebSocketApp(
+                self.esp32_url,
+                on_open=self.on_open,
+                on_message=self.on_message,
+                on_error=self.on_error,
+                on_close=self.on_close
+            )
+            
+            # Start connection in a separate thread
+            self.ws.run_forever()
+            
+        except Exception as e:
+            logger.error(f"ESP32 connection error: {e}")
+            
+    def close(self):
+        """Close the WebSocket, ending run_forever on the ingest thread"""
+        self.closing = True
+        if self.ws is not None:
+            self.ws.close()
+            
+    def on_open(self, ws):
+        self.connected = True
+        logger.info("Connected to ESP32")
+        runtime.emit('esp32_status', {'status': 'connected', 'device_id': self.session.device_id})
+        
+    def on_message(self, ws, message):
+        try:
+            # Per-sample detail is only built when DEBUG is enabled (see /api/admin/logging)
+            debug = logger.isEnabledFor(logging.DEBUG)
+            if debug:
+                logger.debug(f"Raw message received: {message[:200]}...", extra={'msg_type': 'esp32.raw'})
+            
+            data = json.loads(message)
+            
+            if 'channels' in data:
+                if debug:
+                    logger.debug(
+                        f"Parsed JSON keys: {list(data.keys())}, {len(data['channels'])} channels: {data['channels']}",
+                        extra={'msg_type': 'esp32.channels'}
+                    )
+                
+                # Extract channel values with error handling
+                channel_values = []
+                for i, channel in enumerate(data['channels']):
+                    if isinstance(channel, dict) and 'value' in channel:
+                        try:
+                            channel_values.append(float(channel['value']))
+                        except (ValueError, TypeError) as e:
+                            logger.error(
+                                f"Invalid value in channel {i}: {channel.get('value', 'MISSING')} - {e}",
+                                extra={'msg_type': 'esp32.invalid_value'}
+                            )
+                            channel_values.append(0.0)  # Default fallback
+                    else:
+                        logger.error(
+                            f"Channel {i} missing 'value' key or not dict: {channel}",
+                            extra={'msg_type': 'esp32.invalid_value'}
+                        )
+                        channel_values.append(0.0)  # Default fallback
+                
+                if debug:
+                    logger.debug(f"Channel values: {channel_values}", extra={'msg_type': 'esp32.values'})
+                
+                num_channels = self.session.processor.num_channels
+                if not np.isfinite(channel_values).all():
+                    # A NaN or inf would spread over every key window it falls in
+                    logger.warning(
+                        f"Dropping sample with non-finite values: {channel_values}",
+                        extra={'msg_type': 'esp32.non_finite'}
+                    )
+                elif len(channel_values) == num_channels:  # Only process complete samples
+                    # Add to processor
+                    self.session.ingest([channel_values])
+                    
+                    # Emit to web clients following the raw stream
+                    runtime.emit('eeg_data', {
+                        'channels': channel_values,
+                        'timestamp': data.get('timestamp', time.time()),
+                        'buffer_ready': self.session.processor.get_buffer_status()
+                    }, to=RAW_STREAM_ROOM)
+                    
+                    # Log success occasionally
+                    if hasattr(self, '_message_count'):
+                        self._message_count += 1
+                    else:
+                        self._message_count = 1
+                        
+                    if self._message_count % 50 == 0:  # Every 50 messages
+                        logger.info(f"Successfully processed {self._message_count} messages")
+                else:
+                    logger.error(
+                        f"❌ CHANNEL COUNT MISMATCH: Expected {num_channels} channels, got {len(channel_values)}",
+                        extra={'msg_type': 'esp32.channel_count'}
+                    )
+            else:
+                logger.error(
+                    f"No 'channels' key in message. Available keys: {list(data.keys())}",
+                    extra={'msg_type': 'esp32.no_channels'}
+                )
+                
+        except json.JSONDecodeError as e:
+            logger.error(f"JSON decode error: {e} - Raw message: {message[:100]}...", extra={'msg_type': 'esp32.json'})
+        except Exception as e:
+            logger.exception(
+                f"Error processing ESP32 message: {e} - Message content: {message[:200]}...",
+                extra={'msg_type': 'esp32.error'}
+            )
+            
+    def on_error(self, ws, error):
+        self.connected = False
+        if self.closing:
+            return  # Closed on purpose; a replacement session may already be streaming
+        logger.error(f"ESP32 WebSocket error: {error}")
+        runtime.emit('esp32_status', {'status': 'error', 'message': str(error), 'device_id': self.session.device_id})
+        
+    def on_close(self, ws, close_status_code, close_msg):
+        self.connected = False
+        if self.closing:
+            return  # DeviceSession.close releases the recorder
+        if self.session.recorder:
+            self.session.recorder.close()
+        logger.info("ESP32 connection closed")
+        runtime.emit('esp32_status', {'status': 'disconnected', 'device_id': self.session.device_id})
+
+def get_request_session():
+    """Session named by the request's device parameter, or the latest one"""
+    device_id = request.args.get('device') or (request.get_json(silent=True) or {}).get('device')
+    return sessions.get(device_id)
+
+def session_not_found():
+    return jsonify({'status': 'error', 'message': 'Unknown device'}), 404
+
+def parse_session_rates(options):
+    """(device_rate, processing_rate) from request options, raising ValueError if invalid
+
+    processing_rate defaults to the device rate, so no band the device can
+    capture is low-passed away on ingest.
+    """
+    try:
+        device_rate = float(options.get('device_rate', DEVICE_SAMPLE_RATE))
+        processing_rate = float(options.get('processing_rate', device_rate))
+    except (ValueError, TypeError):
+        device_rate = processing_rate = 0
+    if device_rate <= 0 or processing_rate <= 0:
+        raise ValueError('device_rate and processing_rate must be positive numbers')
+    bands = unusable_bands(processing_rate)
+    if bands:
+        logger.warning(
+            f"Processing rate {processing_rate:g} Hz cannot resolve {', '.join(bands)} "
+            f"(Nyquist {processing_rate / 2:g} Hz); those bands pass through unfiltered"
+        )
+    return device_rate, processing_rate
+
+def unusable_bands(sample_rate, frequency_bands=DEFAULT_FREQUENCY_BANDS):
+    """Bands whose upper edge is not below the Nyquist frequency of sample_rate"""
+    return [name for name, (low, high) in frequency_bands.items() if high >= sample_rate / 2.0]
+
+def parse_session_montage(options, default_channels=None):
+    """(num_channels, montage) from request options, raising ValueError if invalid
+
+    montage is a list of channel labels (or a comma-separated string); when
+    only the montage is given its length is the channel count.
+    """
+    montage = options.get('montage')
+    if isinstance(montage, str):
+        montage = [label.strip() for label in montage.split(',')]
+    if montage is not None and not isinstance(montage, list):
+        raise ValueError('montage must be a list of channel labels')
+    
+    default = len(montage) if montage else (default_channels or processor.num_channels)
+    try:
+        num_channels = int(options.get('num_channels', default))
+    except (ValueError, TypeError):
+        num_channels = 0
+    if not 1 <= num_channels <= MAX_CHANNELS:
+        raise ValueError(f'num_channels must be between 1 and {MAX_CHANNELS}')
+    if montage is not None and len(montage) != num_channels:
+        raise ValueError(f'montage names {len(montage)} channels, expected {num_channels}')
+    return num_channels, [str(label) for label in montage] if montage else None
+
+def create_device_session(device_id, device_rate, processing_rate, record=False, num_channels=None, montage=None):
+    """A new session configured like the default processor, resampling device_rate to processing_rate"""
+    device_processor = BrainAuthProcessor(
+        sample_rate=processing_rate,
+        buffer_duration=processor.buffer_duration,
+        spectral_mode=processor.spectral_mode,
+        num_channels=num_channels or processor.num_channels,
+        montage=montage
+    )
+    recorder = None
+    if record:
+        recorder = SessionRecorder(
+            RECORDING_DIR, device_id, device_rate, device_processor.num_channels, montage=device_processor.montage
+        )
+    resampler = StreamingResampler(device_rate, processing_rate, device_processor.num_channels)
+    return DeviceSession(device_id, device_processor, recorder=recorder, resampler=resampler)
+
+# Per-user enrollment templates, and enrollments by user id (str). Finished
+# enrollments are kept for ENROLLMENT_RESULT_TTL seconds so their outcome
+# (including failures) can be read back, then pruned
+template_store = TemplateStore(os.environ.get('BRAIN_AUTH_ENROLLMENT_DIR', 'enrollments'))
+enrollments = {}
+enrollments_lock = Lock()
+ENROLLMENT_RESULT_TTL = float(os.environ.get('BRAIN_AUTH_ENROLLMENT_RESULT_TTL', 300))
+
+def prune_enrollments():
+    """Drop enrollments that finished over ENROLLMENT_RESULT_TTL ago; hold enrollments_lock"""
+    now = time.time()
+    expired = [user_id for user_id, enrollment in enrollments.items()
+               if enrollment.done and now - enrollment.finished_at > ENROLLMENT_RESULT_TTL]
+    for user_id in expired:
+        del enrollments[user_id]
+
+# Periodic memory-mapped checkpoints of all sessions, restored on startup
+checkpointer = SessionCheckpointer(
+    os.environ.get('BRAIN_AUTH_CHECKPOINT_DIR', 'checkpoints'),
+    sessions,
+    interval=float(os.environ.get('BRAIN_AUTH_CHECKPOINT_INTERVAL', 5)),
+    max_age=float(os.environ.get('BRAIN_AUTH_CHECKPOINT_MAX_AGE', 60))
+)
+
+def restore_sessions():
+    """Recreate sessions from fresh checkpoints, reconnecting ESP32 devices"""
+    for state, buffers in checkpointer.load():
+        device_id = state['device_id']
+        try:
+            if device_id == 'default':
+                session = sessions.get('default')
+                session.restore_checkpoint(state, buffers)
+            else:
+                session = DeviceSession(device_id, BrainAuthProcessor(
+                    sample_rate=state['sample_rate'],
+                    buffer_duration=state['buffer_duration'],
+                    spectral_mode=state['spectral_mode'],
+                    consensus_duration=state['consensus_duration'],
+                    num_channels=state['num_channels'],
+                    montage=state['montage']
+                ), resampler=StreamingResampler(state['device_rate'], state['sample_rate'], state['num_channels']))
+                session.restore_checkpoint(state, buffers)
+                sessions.add(session)
+        except (ValueError, KeyError, MemoryBudgetExceeded) as e:
+            logger.warning(f"Could not restore session {device_id}: {e}")
+            continue
+        
+        if state.get('esp32_url'):
+            session.client = ESP32Client(state['esp32_url'], session)
+            session.start(session.client.connect, runtime)
+        logger.info(f"Restored session {device_id}: {state['sample_seq']} samples, {len(state['key_history'])} keys")
+
+def start_checkpoints():
+    """Restore checkpointed sessions and start checkpointing (serving process only)"""
+    if checkpointer.interval <= 0:
+        return
+    restore_sessions()
+    checkpointer.start()
+    atexit.register(checkpointer.stop)
+
+def run_server(host='0.0.0.0', port=5000, debug=False):
+    """Serve the app with the web server of the configured async mode
+
+    The threading model is served by Werkzeug's development server, which
+    is only allowed with debug or BRAIN_AUTH_ALLOW_WERKZEUG set.
+    """
+    options = {}
+    if socketio.async_mode == 'threading':
+        if not (debug or os.environ.get('BRAIN_AUTH_ALLOW_WERKZEUG')):
+            raise RuntimeError(
+                "async_mode=threading serves with Werkzeug's development server; use "
+                "BRAIN_AUTH_ASYNC_MODE=eventlet or gevent in production, or set BRAIN_AUTH_ALLOW_WERKZEUG=1"
+            )
+        options['allow_unsafe_werkzeug'] = True
+    logger.info(f"Serving on {host}:{port} with async_mode={socketio.async_mode}")
+    socketio.run(app, host=host, port=port, debug=debug, **options)
+
+@app.route('/')
+def index():
+    return render_template('index.html')
+
+@app.route('/api/connect_esp32', methods=['POST'])
+def connect_esp32():
+    data = request.json
+    esp32_ip = data.get('esp32_ip', '192.168.1.100')
+    esp32_url = f"ws://{esp32_ip}/ws"
+    device_id = str(data.get('device_id', esp32_ip))
+    
+    try:
+        device_rate, processing_rate = parse_session_rates(data)
+        num_channels, montage = parse_session_montage(data)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    
+    session = None
+    try:
+        session = create_device_session(
+            device_id, device_rate, processing_rate, record=data.get('record'),
+            num_channels=num_channels, montage=montage
+        )
+        session.client = ESP32Client(esp32_url, session)
+        
+        # Replaces (and closes) any previous session for this device
+        sessions.add(session)
+        
+        # Start the connection as an ingest task on the server's concurrency model
+        session.start(session.client.connect, runtime)
+        
+        return jsonify({
+            'status': 'connecting',
+            'url': esp32_url,
+            'device_id': device_id,
+            'device_rate': device_rate,
+            'processing_rate': processing_rate,
+            'unusable_bands': unusable_bands(processing_rate),
+            'num_channels': session.processor.num_channels,
+            'montage': session.processor.montage
+        })
+        
+    except MemoryBudgetExceeded as e:
+        session.close()
+        return jsonify({'status': 'error', 'message': str(e)}), 503
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)})
+
+@app.route('/api/samples', methods=['POST'])
+def upload_samples():
+    """Append a block of samples to a device's buffers in one operation
+
+    The device is taken from the device query parameter; an ingest-only
+    session is created for unknown devices (device_rate/processing_rate
+    query parameters as for /api/connect_esp32). See parse_sample_upload
+    for the accepted body formats; gzip/deflate bodies are supported. New
+    sessions get the upload's channel count unless num_channels/montage are
+    given.
+    """
+    device_id = request.args.get('device')
+    if not device_id:
+        return jsonify({'status': 'error', 'message': 'device query parameter is required'}), 400
+    
+    try:
+        body = decompress_upload(request.get_data(cache=False), request.headers.get('Content-Encoding', '').lower())
+        samples = parse_sample_upload(body, request.mimetype, request.headers)
+    except (ValueError, KeyError, TypeError, zlib.error) as e:
+        return jsonify({'status': 'error', 'message': f"Invalid sample upload: {e}"}), 400
+    
+    session = sessions.get(device_id)
+    if session is None:
+        try:
+            device_rate, processing_rate = parse_session_rates(request.args)
+            # New sessions take their channel count from the upload unless given
+            num_channels, montage = parse_session_montage(request.args, samples.shape[1])
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        try:
+            session = sessions.add(create_device_session(
+                device_id, device_rate, processing_rate, num_channels=num_channels, montage=montage
+            ))
+        except MemoryBudgetExceeded as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 503
+    
+    if samples.shape[1] != session.processor.num_channels:
+        return jsonify({
+            'status': 'error',
+            'message': f"Expected {session.processor.num_channels} channels, got {samples.shape[1]}"
+        }), 400
+    
+    # Resampling a large block is CPU-bound; keep it off the hub in green modes
+    runtime.run_blocking(session.ingest, samples)
+    return jsonify({
+        'status': 'success',
+        'device_id': session.device_id,
+        'samples': len(samples),
+        'last_seq': session.processor.sample_seq,
+        'buffer_ready': session.processor.get_buffer_status()
+    })
+
+@app.route('/api/export', methods=['GET'])
+def export_data():
+    """Stream buffer, history or a recorded session as chunked npy/arrow/csv
+
+    buffer is the key window and history the consensus window held in
+    memory (consensus_size samples); only recordings hold a session's full
+    sample stream. Query parameters: source (buffer|history|recordings), format
+    (npy|arrow|csv), device and session (recordings only; defaults to the
+    latest session), start/end (seconds from the first sample) and
+    channels (comma-separated indices).
+    """
+    source = request.args.get('source', 'buffer')
+    fmt = request.args.get('format', 'npy')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'status': 'error', 'message': f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    if fmt == 'arrow' and not arrow_available():
+        return jsonify({'status': 'error', 'message': 'Arrow export requires pyarrow'}), 501
+    
+    try:
+        start = float(request.args['start']) if 'start' in request.args else None
+        end = float(request.args['end']) if 'end' in request.args else None
+        channels = [int(c) for c in request.args['channels'].split(',')] if 'channels' in request.args else None
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid start, end or channels'}), 400
+    
+    if source in ('buffer', 'history'):
+        session = get_request_session()
+        if session is None:
+            return session_not_found()
+        processor = session.processor
+        n_samples = processor.buffer_size if source == 'buffer' else processor.consensus_size
+        with processor.buffer_lock:
+            n_samples = min([n_samples] + [len(buffer) for buffer in processor.data_buffers])
+        data = processor.take_snapshot(n_samples).T
+        sample_rate = processor.sample_rate
+        start_time = time.time() - n_samples / sample_rate
+        name = source
+    elif source == 'recordings':
+        recordings = list_recordings(RECORDING_DIR, request.args.get('device'))
+        session_name = request.args.get('session')
+        if session_name:
+            recordings = [meta for meta in recordings if meta['session'] == safe_name(session_name)]
+        if not recordings:
+            return jsonify({'status': 'error', 'message': 'Recording not found'}), 404
+        meta = recordings[-1]
+        recorder = sessions.find_recorder(meta['path'])
+        if recorder:
+            recorder.flush()
+        data = open_recording(meta)
+        sample_rate = meta['sample_rate']
+        start_time = meta['started_at']
+        name = f"{meta['device']}_{meta['session']}"
+    else:
+        return jsonify({'status': 'error', 'message': 'source must be buffer, history or recordings'}), 400
+    
+    if channels is not None and any(c < 0 or c >= data.shape[1] for c in channels):
+        return jsonify({'status': 'error', 'message': 'Channel index out of range'}), 400
+    
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    chunks = stream_export(fmt, data, sample_rate, start, end, channels, start_time)
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{name}.{extension}"'}
+    )
+
+@app.route('/api/generate_key', methods=['POST'])
+def generate_key():
+    received = time.perf_counter()
+    session = get_request_session()
+    if session is None:
+        return session_not_found()
+    session.touch()
+    processor = session.processor
+    
+    if not processor.get_buffer_status():
+        return jsonify({
+            'status': 'error',
+            'message': 'Insufficient data. Need 2 seconds of EEG data.'
+        })
+    
+    options = request.get_json(silent=True) or {}
+    try:
+        consensus_windows = max(1, int(options.get('consensus_windows', request.args.get('consensus_windows', 1))))
+    except (ValueError, TypeError):
+        return jsonify({'status': 'error', 'message': 'consensus_windows must be an integer'})
+    if consensus_windows > MAX_CONSENSUS_WINDOWS:
+        return jsonify({
+            'status': 'error',
+            'message': f'consensus_windows must be at most {MAX_CONSENSUS_WINDOWS}'
+        }), 400
+    # Short consensus buffers hold fewer distinct windows; report the count actually used
+    consensus_windows = min(consensus_windows, processor.max_consensus_windows)
+    consensus = options.get('consensus', request.args.get('consensus', 'median'))
+    if consensus not in CONSENSUS_METHODS:
+        return jsonify({'status': 'error', 'message': f"consensus must be one of {', '.join(CONSENSUS_METHODS)}"})
+    try:
+        deadline_ms = float(options.get('deadline_ms', request.args.get('deadline_ms', key_scheduler.default_deadline_ms)))
+    except (ValueError, TypeError):
+        return jsonify({'status': 'error', 'message': 'deadline_ms must be a number'})
+    
+    # Enrolled users get keys quantized by their own template
+    user_id = options.get('user_id', request.args.get('user_id'))
+    template = None
+    if user_id:
+        user_id = str(user_id)
+        template = template_store.load(user_id)
+        if template is None:
+            return jsonify({'status': 'error', 'message': f'User {user_id} is not enrolled'}), 404
+    
+    # Pick a configuration that fits the deadline, or reject before queueing
+    mode, windows, predicted_ms = 'full', consensus_windows, 0.0
+    if deadline_ms > 0:
+        budget_ms = deadline_ms - (time.perf_counter() - received) * 1000.0
+        try:
+            # The last key may belong to another template, so template keys are never served from cache
+            mode, windows, predicted_ms = key_scheduler.choose(
+                processor, consensus_windows, budget_ms, allow_cached=template is None
+            )
+        except AdmissionRejected as e:
+            response = jsonify({'status': 'error', 'message': str(e), 'retry_after': e.retry_after})
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response, 503
+    
+    try:
+        processor.is_processing = True
+        timings = {}
+        if mode == 'cached':
+            key_age_ms = key_scheduler.cached_key_age_ms(processor)
+            brain_key, message = processor.last_key, 'Served precomputed key'
+        else:
+            with key_scheduler.job(predicted_ms):
+                brain_key, message = runtime.run_blocking(
+                    key_profiler.run, processor.generate_brain_key, timings, windows, consensus, template
+                )
+            key_scheduler.record(key_scheduler.config_key(processor, windows), timings)
+        
+        if brain_key:
+            consistency = processor.get_key_consistency()
+            
+            response = {
+                'status': 'success',
+                'brain_key': brain_key,
+                'key_length': len(brain_key),
+                'consistency': consistency,
+                'message': message,
+                'consensus_windows': windows,  # None for a precomputed key
+                'timestamp': time.time()
+            }
+            if template is not None:
+                response['user_id'] = template.user_id
+            if deadline_ms > 0:
+                elapsed_ms = (time.perf_counter() - received) * 1000.0
+                key_scheduler.count(mode)
+                response.update({
+                    'mode': mode,
+                    'deadline_ms': deadline_ms,
+                    'elapsed_ms': elapsed_ms,
+                    'deadline_met': elapsed_ms <= deadline_ms
+                })
+                if mode == 'cached':
+                    response['key_age_ms'] = key_age_ms
+            if request.args.get('profile') in ('1', 'true'):
+                response['profile'] = {
+                    'stages_ms': timings,
+                    'total_ms': sum(timings.values())
+                }
+            return jsonify(response)
+        else:
+            return jsonify({
+                'status': 'error',
+                'message': message
+            })
+            
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        })
+    finally:
+        processor.is_processing = False
+
+@app.route('/api/enroll', methods=['POST'])
+def start_enrollment():
+    """Enroll a user from the device's stream over the next duration seconds
+
+    JSON body: user_id (required), device, duration (seconds, default 30),
+    hop (seconds between windows, default 0.5) and tolerance_sigmas
+    (default 3). Progress and the finished template are read with GET.
+    """
+    session = get_request_session()
+    if session is None:
+        return session_not_found()
+    data = request.get_json(silent=True) or {}
+    user_id = data.get('user_id')
+    if not user_id:
+        return jsonify({'status': 'error', 'message': 'user_id is required'}), 400
+    user_id = str(user_id)
+    try:
+        duration = float(data.get('duration', 30))
+        hop = float(data.get('hop', 0.5))
+        tolerance_sigmas = float(data.get('tolerance_sigmas', 3.0))
+    except (ValueError, TypeError):
+        return jsonify({'status': 'error', 'message': 'duration, hop and tolerance_sigmas must be numbers'}), 400
+    if duration <= 0 or hop <= 0 or tolerance_sigmas <= 0:
+        return jsonify({'status': 'error', 'message': 'duration, hop and tolerance_sigmas must be positive'}), 400
+    
+    with enrollments_lock:
+        prune_enrollments()
+        current = enrollments.get(user_id)
+        if current is not None and not current.done:
+            return jsonify({'status': 'error', 'message': f'User {user_id} is already enrolling'}), 409
+        enrollment = Enrollment(user_id, session, duration, hop, tolerance_sigmas)
+        enrollments[user_id] = enrollment
+    runtime.start_background_task(run_enrollment, enrollment)
+    return jsonify({'status': 'enrolling', 'user_id': user_id, 'device_id': session.device_id, 'duration': duration}), 202
+
+@app.route('/api/enroll', methods=['GET'])
+def get_enrollment():
+    """Progress of a running enrollment, or the stored template summary"""
+    user_id = request.args.get('user_id')
+    if not user_id:
+        return jsonify({'status': 'error', 'message': 'user_id is required'}), 400
+    with enrollments_lock:
+        prune_enrollments()
+        enrollment = enrollments.get(user_id)
+    if enrollment is not None:
+        return jsonify(enrollment.progress())
+    template = template_store.load(user_id)
+    if template is None:
+        return jsonify({'status': 'error', 'message': f'User {user_id} is not enrolled'}), 404
+    return jsonify({'status': 'complete', 'user_id': user_id, 'template': template.summary()})
+
+def run_enrollment(enrollment):
+    template = enrollment.run(sleep=runtime.sleep, run_blocking=runtime.run_blocking)
+    if template is not None:
+        template_store.save(template)
+        logger.info(f"Enrolled {enrollment.user_id} from {template.windows} windows")
+    runtime.emit('enrollment_status', enrollment.progress())
+
+def admin_authorized():
+    """Admin endpoints require X-Admin-Token when BRAIN_AUTH_ADMIN_TOKEN is set"""
+    admin_token = os.environ.get('BRAIN_AUTH_ADMIN_TOKEN')
+    if not admin_token:
+        return True
+    # Constant-time comparison, so response timing does not leak the token
+    return hmac.compare_digest(request.headers.get('X-Admin-Token', '').encode(), admin_token.encode())
+
+def parse_limit(default):
+    """The request's non-negative limit parameter, or None if invalid"""
+    try:
+        limit = int(request.args.get('limit', default))
+    except ValueError:
+        return None
+    return limit if limit >= 0 else None
+
+@app.route('/api/admin/profile', methods=['GET', 'POST'])
+def admin_profile():
+    """Arm sampled profiling (POST) or read the aggregated stats (GET)"""
+    if not admin_authorized():
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 403
+    
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            requests_to_profile = int(data.get('requests', 10))
+        except (ValueError, TypeError):
+            return jsonify({'status': 'error', 'message': 'requests must be an integer'}), 400
+        key_profiler.arm(requests_to_profile, bool(data.get('tracemalloc', False)))
+        return jsonify({'status': 'armed', 'requests': requests_to_profile})
+    
+    limit = parse_limit(25)
+    if limit is None:
+        return jsonify({'status': 'error', 'message': 'limit must be a non-negative integer'}), 400
+    return jsonify(key_profiler.report(limit))
+
+@app.route('/api/admin/leak_check', methods=['GET', 'POST'])
+def admin_leak_check():
+    """Start/stop tracemalloc leak checking (POST) or read growth since baseline (GET)"""
+    if not admin_authorized():
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 403
+    
+    if request.method == 'POST':
+        action = (request.get_json(silent=True) or {}).get('action', 'start')
+        if action == 'stop':
+            leak_checker.stop()
+        else:
+            leak_checker.start()
+        return jsonify({'status': 'ok', 'active': leak_checker.active})
+    
+    limit = parse_limit(20)
+    if limit is None:
+        return jsonify({'status': 'error', 'message': 'limit must be a non-negative integer'}), 400
+    report = leak_checker.report(limit)
+    report['memory'] = sessions.memory_report()
+    report['threads'] = threading.active_count()
+    return jsonify(report)
+
+@app.route('/api/admin/logging', methods=['GET', 'POST'])
+def admin_logging():
+    """Change log levels, rate limits and sampling at runtime (POST) or read them (GET)"""
+    if not admin_authorized():
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 403
+    
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            log_control.set_levels(data.get('level'), data.get('loggers'))
+            log_control.rate_filter.configure(data.get('rate_limits'), data.get('sampling'), data.get('default_rate'))
+        except (ValueError, TypeError, AttributeError) as e:
+            return jsonify({'status': 'error', 'message': f'Invalid logging settings: {e}'}), 400
+    
+    return jsonify(log_control.report())
+
+@app.route('/api/admin/key_costs', methods=['GET'])
+def admin_key_costs():
+    """Measured per-stage key costs, queue depth and deadline mode counts"""
+    if not admin_authorized():
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 403
+    return jsonify(key_scheduler.report())
+
+@app.route('/api/status', methods=['GET'])
+def get_status():
+    session = get_request_session()
+    if session is None:
+        return session_not_found()
+    processor = session.processor
+    memory = sessions.memory_report()
+    memory['threads'] = threading.active_count()
+    memory['socket_clients'] = len(client_sample_seq)
+    return jsonify({
+        'device_id': session.device_id,
+        'num_channels': processor.num_channels,
+        'montage': processor.montage,
+        'buffer_ready': processor.get_buffer_status(),
+        'is_processing': processor.is_processing,
+        'esp32_connected': session.client.connected if session.client else False,
+        'key_history_count': len(processor.key_history),
+        'last_key_preview': processor.last_key[:32] + '...' if processor.last_key else None,
+        'memory': memory,
+        'checkpoints': checkpointer.report(),
+        'band_power': band_power_publisher.report(),
+        'concurrency': runtime.report()
+    })
+
+@socketio.on('connect')
+def handle_connect():
+    logger.info('Client connected to WebSocket')
+    join_room(RAW_STREAM_ROOM)
+    emit('status', {'message': 'Connected to BrainAuth server'})
+
+@socketio.on('disconnect')
+def handle_disconnect():
+    client_sample_seq.pop(request.sid, None)
+    band_power_publisher.unsubscribe(request.sid)
+    logger.info('Client disconnected from WebSocket')
+
+@socketio.on('subscribe_band_power')
+def handle_subscribe_band_power(data=None):
+    """Receive band_power events for a device ('device', default: latest)
+
+    With {'raw': false} the client also stops receiving the raw eeg_data
+    stream. The reply is a band_power_info event describing the payload.
+    """
+    data = data if isinstance(data, dict) else {}
+    session = sessions.get(data.get('device'))
+    if session is None:
+        emit('band_power_info', {'status': 'error', 'message': 'Unknown device'})
+        return
+    
+    join_room(band_power_room(session.device_id))
+    if data.get('raw') is False:
+        leave_room(RAW_STREAM_ROOM)
+    band_power_publisher.subscribe(request.sid, session.device_id)
+    emit('band_power_info', dict(band_power_publisher.info(session), status='subscribed'))
+
+@socketio.on('unsubscribe_band_power')
+def handle_unsubscribe_band_power(data=None):
+    """Stop band_power events for a device (or all) and resume the raw stream"""
+    device_id = data.get('device') if isinstance(data, dict) else None
+    left = band_power_publisher.unsubscribe(request.sid, device_id)
+    for device in set(left) | ({device_id} if device_id else set()):
+        leave_room(band_power_room(device))
+    join_room(RAW_STREAM_ROOM)
+
+@socketio.on('request_eeg_data')
+def handle_request_eeg_data(data=None):
+    """Send the samples a client has not seen yet as one compressed block.
+
+    Clients may pass {'last_seq': n} to acknowledge the last sample they
+    decoded; otherwise the last sequence sent to this sid is used. 'device'
+    selects the session (default: the latest connected). The first
+    request (or one that fell behind the buffer) gets a full snapshot.
+    """
+    device_id = data.get('device') if isinstance(data, dict) else None
+    session = sessions.get(device_id)
+    if session is None:
+        emit('eeg_data_block', {'status': 'error', 'message': 'Unknown device'})
+        return
+    processor = session.processor
+    client_seqs = client_sample_seq.setdefault(request.sid, {})
+    
+    last_seq = client_seqs.get(session.device_id)
+    if isinstance(data, dict) and data.get('last_seq') is not None:
+        try:
+            last_seq = int(data['last_seq'])
+        except (ValueError, TypeError):
+            last_seq = None
+
+    first_seq, samples = processor.get_samples_since(last_seq)
+    snapshot = last_seq is None or first_seq != last_seq + 1
+    last_sent = first_seq + len(samples) - 1
+    client_seqs[session.device_id] = last_sent
+
+    block = encode_sample_block(samples)
+    block.update({
+        'device_id': session.device_id,
+        'first_seq': first_seq,
+        'last_seq': last_sent,
+        'snapshot': snapshot,
+        'sample_rate': processor.sample_rate,
+        'buffer_ready': processor.get_buffer_status()
+    })
+    emit('eeg_data_block', block)
+
+if __name__ == '__main__':
+    logger.info("Starting BrainAuth server...")
+    # With the debug reloader only the child process (WERKZEUG_RUN_MAIN) serves requests
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_checkpoints()
+    run_server(debug=True) 
\ No newline at end of file
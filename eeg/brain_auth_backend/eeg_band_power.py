@@ -0,0 +1,135 @@
+"""
+BrainID Neural Authentication System
+Band Power Streaming
+
+Dashboards subscribe to per-channel delta/theta/alpha/beta/gamma band
+powers instead of the raw 100 Hz sample stream. BandPowerPublisher runs
+the processor's filter bank and spectrum (the filter and band_power
+pipeline stages) over the newest window of each subscribed device at a
+fixed hop and emits one compact band_power event per hop to that device's
+Socket.IO room. Devices without subscribers cost nothing. The DSP runs
+through the runtime's run_blocking, so in green modes it is handed to the
+native thread pool instead of stalling the hub.
+"""
+
+import logging
+import time
+from threading import Lock
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def band_power_room(device_id):
+    return f"band_power:{device_id}"
+
+def compact(values, digits=4):
+    """Nested lists of values rounded to significant digits, NaN as None"""
+    return [
+        [None if np.isnan(value) else float(f"{value:.{digits}g}") for value in row]
+        for row in np.atleast_2d(values)
+    ]
+
+class BandPowerPublisher:
+    """Computes band powers of subscribed sessions every 1/hop_hz seconds and emits them"""
+
+    def __init__(self, runtime, sessions, hop_hz=4.0, window_seconds=None):
+        self.runtime = runtime  # AsyncRuntime the task runs, computes and emits on
+        self.sessions = sessions
+        self.hop_hz = hop_hz
+        self.window_seconds = window_seconds  # None = the processor's key window
+        self.lock = Lock()
+        self.subscribers = {}  # device_id -> set of sids
+        self.last_seq = {}     # device_id -> sample_seq of the last published powers
+        self.running = False
+        self.published = 0
+
+    def window_samples(self, processor):
+        if self.window_seconds is None:
+            return processor.buffer_size
+        return max(1, int(self.window_seconds * processor.sample_rate))
+
+    def info(self, session):
+        """Static description of a device's band_power events, sent on subscribe"""
+        processor = session.processor
+        return {
+            'device_id': session.device_id,
+            'bands': list(processor.frequency_bands),
+            'band_ranges': [list(band) for band in processor.frequency_bands.values()],
+            'montage': processor.montage,
+            'hop_hz': self.hop_hz,
+            'window_seconds': self.window_samples(processor) / processor.sample_rate,
+            'units': 'mean squared amplitude'
+        }
+
+    def subscribe(self, sid, device_id):
+        with self.lock:
+            self.subscribers.setdefault(device_id, set()).add(sid)
+            start = not self.running
+            self.running = True
+        if start:
+            self.runtime.start_background_task(self.run)
+
+    def unsubscribe(self, sid, device_id=None):
+        """Remove sid from one device's subscribers, or from all of them
+
+        Returns the devices sid was subscribed to.
+        """
+        left = []
+        with self.lock:
+            for device in [device_id] if device_id is not None else list(self.subscribers):
+                subscribers = self.subscribers.get(device)
+                if subscribers is not None and sid in subscribers:
+                    left.append(device)
+                    subscribers.discard(sid)
+                    if not subscribers:
+                        del self.subscribers[device]
+                        self.last_seq.pop(device, None)
+        return left
+
+    def run(self):
+        next_tick = time.monotonic()
+        while True:
+            try:
+                self.publish()
+            except Exception as e:
+                logger.error(f"Band power publishing failed: {e}", extra={'msg_type': 'band_power.error'})
+            next_tick += 1.0 / self.hop_hz
+            delay = next_tick - time.monotonic()
+            if delay < 0:
+                # Fell behind; skip missed hops rather than bursting
+                next_tick = time.monotonic()
+                delay = 0
+            self.runtime.sleep(delay)
+
+    def publish(self):
+        with self.lock:
+            devices = list(self.subscribers)
+        for device_id in devices:
+            session = self.sessions.get(device_id)
+            if session is None:
+                continue
+            processor = session.processor
+            sample_seq = processor.sample_seq
+            if self.last_seq.get(device_id) == sample_seq:
+                continue  # No new samples since the last hop
+            powers = self.runtime.run_blocking(processor.band_powers, self.window_samples(processor))
+            if powers is None:
+                continue  # Window not filled yet
+            self.last_seq[device_id] = sample_seq
+            self.runtime.emit('band_power', {
+                'device_id': device_id,
+                'seq': sample_seq,
+                'timestamp': time.time(),
+                'power': compact(powers)
+            }, to=band_power_room(device_id))
+            self.published += 1
+
+    def report(self):
+        with self.lock:
+            return {
+                'hop_hz': self.hop_hz,
+                'running': self.running,
+                'published': self.published,
+                'subscribers': {device: len(sids) for device, sids in self.subscribers.items()}
+            }
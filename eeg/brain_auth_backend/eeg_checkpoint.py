@@ -0,0 +1,178 @@
+"""
+BrainID Neural Authentication System
+Session Checkpoints
+
+Periodically saves every device session (ring buffers, resampler filter
+state, key history and session metadata) so a restarted server can pick
+up where it left off instead of waiting for buffers to refill:
+
+    checkpoints/<device>.npy   (2, num_channels, consensus_size) float64, memory-mapped
+    checkpoints/<device>.json  metadata, including which of the two slots is current
+
+Buffers are written into the inactive slot of the mapped file and the
+sidecar is then atomically replaced to point at it, so a crash mid-write
+leaves the previous checkpoint intact. Sessions that have not changed
+since their last checkpoint are skipped, and checkpoints of sessions that
+no longer exist are removed.
+
+The sidecar holds each device's recent brain keys (key_history, last_key),
+which are credentials. The directory is created 0700 and the files 0600,
+and the directory must be kept as private as the keys themselves.
+"""
+
+import json
+import logging
+import os
+import time
+from threading import Event, Lock, Thread
+
+import numpy as np
+
+from eeg_recording import safe_name
+
+logger = logging.getLogger(__name__)
+
+def create_private(path):
+    """Create or truncate path for writing, readable only by its owner"""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    os.chmod(path, 0o600)  # An existing file keeps its old mode otherwise
+    return os.fdopen(fd, 'w')
+
+class SessionCheckpointer:
+    """Writes and loads memory-mapped checkpoints of a SessionManager's sessions"""
+
+    def __init__(self, root, sessions, interval=5.0, max_age=60.0):
+        self.root = root
+        self.sessions = sessions
+        self.interval = interval  # Seconds between checkpoints
+        self.max_age = max_age    # Oldest checkpoint restored on startup, in seconds
+        self.lock = Lock()
+        self.stop_event = Event()
+        self.thread = None
+        self.maps = {}       # device_id -> (memmap, current slot)
+        self.versions = {}   # device_id -> (sample_seq, key count, last key time) last written
+        self.last_run = None
+        self.last_duration_ms = None
+
+    def paths(self, device_id):
+        base = os.path.join(self.root, safe_name(device_id))
+        return base + '.npy', base + '.json'
+
+    def start(self):
+        """Checkpoint all sessions every interval seconds on a daemon thread"""
+        if self.interval <= 0 or self.thread is not None:
+            return
+        self.thread = Thread(target=self._run, name='checkpoint', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop the checkpoint thread after a final checkpoint"""
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+        self.checkpoint_all()
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.checkpoint_all()
+            except Exception as e:
+                logger.error(f"Checkpoint failed: {e}")
+
+    def checkpoint_all(self):
+        started = time.perf_counter()
+        with self.lock:
+            active = self.sessions.all()
+            for session in active:
+                self.checkpoint(session)
+            self.remove_stale({session.device_id for session in active})
+        self.last_run = time.time()
+        self.last_duration_ms = (time.perf_counter() - started) * 1000.0
+
+    def checkpoint(self, session):
+        """Write session into the inactive slot and point the sidecar at it"""
+        processor = session.processor
+        version = (processor.sample_seq, len(processor.key_history), processor.last_key_time)
+        if self.versions.get(session.device_id) == version:
+            return
+
+        shape = (2, processor.num_channels, processor.consensus_size)
+        mapped, slot = self.maps.get(session.device_id) or self.open(session.device_id, shape)
+        if mapped.shape != shape:
+            mapped, slot = self.open(session.device_id, shape)
+        slot = 1 - slot
+        _, meta_path = self.paths(session.device_id)
+
+        state = session.checkpoint_state(mapped[slot])
+        mapped.flush()
+        state.update({'slot': slot, 'written_at': time.time()})
+        tmp_path = meta_path + '.tmp'
+        with create_private(tmp_path) as f:
+            json.dump(state, f)
+        os.replace(tmp_path, meta_path)
+
+        self.maps[session.device_id] = (mapped, slot)
+        self.versions[session.device_id] = version
+
+    def open(self, device_id, shape):
+        """(memmap, current slot), reusing an existing checkpoint file of the right shape"""
+        os.makedirs(self.root, mode=0o700, exist_ok=True)
+        os.chmod(self.root, 0o700)
+        buf_path, meta_path = self.paths(device_id)
+        try:
+            mapped = np.lib.format.open_memmap(buf_path, mode='r+')
+            with open(meta_path) as f:
+                slot = json.load(f)['slot']
+            if mapped.shape == shape and mapped.dtype == np.float64:
+                return mapped, slot
+        except (OSError, ValueError, KeyError):
+            pass
+        create_private(buf_path).close()
+        return np.lib.format.open_memmap(buf_path, mode='w+', dtype=np.float64, shape=shape), 1
+
+    def remove_stale(self, active_ids):
+        for device_id in list(self.maps):
+            if device_id not in active_ids:
+                self.maps.pop(device_id)
+                self.versions.pop(device_id, None)
+                for path in self.paths(device_id):
+                    if os.path.exists(path):
+                        os.remove(path)
+
+    def load(self):
+        """(state, buffers) for every checkpoint younger than max_age, newest activity last"""
+        checkpoints = []
+        if not os.path.isdir(self.root):
+            return checkpoints
+        now = time.time()
+        for filename in sorted(os.listdir(self.root)):
+            if not filename.endswith('.json'):
+                continue
+            meta_path = os.path.join(self.root, filename)
+            try:
+                with open(meta_path) as f:
+                    state = json.load(f)
+                age = now - state['written_at']
+                if age > self.max_age:
+                    logger.info(f"Skipping checkpoint of {state['device_id']} ({age:.0f}s old)")
+                    continue
+                mapped = np.load(meta_path[:-5] + '.npy', mmap_mode='r')
+                buffers = np.array(mapped[state['slot']])
+            except (OSError, ValueError, KeyError, IndexError) as e:
+                logger.warning(f"Unreadable checkpoint {filename}: {e}")
+                continue
+            checkpoints.append((state, buffers))
+        return sorted(checkpoints, key=lambda checkpoint: checkpoint[0]['last_activity'])
+
+    def report(self):
+        return {
+            'directory': self.root,
+            'interval_seconds': self.interval,
+            'max_age_seconds': self.max_age,
+            'active': self.thread is not None,
+            'sessions': len(self.maps),
+            'last_run': self.last_run,
+            'last_duration_ms': self.last_duration_ms
+        }
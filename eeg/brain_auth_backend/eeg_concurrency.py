@@ -0,0 +1,180 @@
+"""
+BrainID Neural Authentication System
+Concurrency Model
+
+The server runs on one explicitly chosen concurrency model,
+BRAIN_AUTH_ASYNC_MODE, which Flask-SocketIO is created and served with:
+
+- threading: native threads. Each ESP32 connection has its own ingest
+  thread and key jobs run on the request's thread. Served by Werkzeug's
+  development server, so meant for debugging.
+- eventlet (default) / gevent: green threads. Sockets, time and select are
+  monkey-patched (threads and locks are not), so ESP32 connections are
+  cheap green tasks on the hub, while CPU-bound key jobs, bulk uploads,
+  band powers and enrollment features are handed to the hub's native
+  thread pool so they never stall it.
+
+In every mode Socket.IO events go through one emit queue: any thread
+(ingest, key jobs, the DSP pool, checkpoints) can enqueue an event without
+blocking, and a single background task on the server's own model drains
+the queue and emits the events in order. Emitters on the server's thread
+wake the drainer immediately; emits from foreign native threads are picked
+up within poll_interval.
+"""
+
+import logging
+import os
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+ASYNC_MODES = ('threading', 'eventlet', 'gevent')
+GREEN_MODES = ('eventlet', 'gevent')
+
+def resolve_async_mode(mode):
+    """Validated async mode name; raises ValueError if unknown or not installed"""
+    mode = str(mode).lower()
+    if mode not in ASYNC_MODES:
+        raise ValueError(f"Unknown async mode {mode!r} (expected one of {', '.join(ASYNC_MODES)})")
+    if mode in GREEN_MODES:
+        try:
+            __import__(mode)
+        except ImportError:
+            raise ValueError(f"Async mode {mode!r} requires the {mode} package")
+    return mode
+
+def monkey_patch(mode):
+    """Make sockets, time and select cooperative for a green mode
+
+    Threads, locks and queues stay native so the DSP pool, key jobs and
+    the logging and checkpoint threads keep running on real threads.
+    """
+    if mode == 'eventlet':
+        import eventlet
+        eventlet.monkey_patch(thread=False)
+    elif mode == 'gevent':
+        from gevent import monkey
+        monkey.patch_all(thread=False, queue=False)
+
+_async_mode = None
+
+def configure_async_mode(mode=None):
+    """Choose and install the concurrency model once and return its name
+
+    Must run before sockets are created. mode defaults to
+    BRAIN_AUTH_ASYNC_MODE (default 'eventlet'); later calls return the
+    mode chosen first, so the startup script can pick it before the server
+    module is imported.
+    """
+    global _async_mode
+    if _async_mode is None:
+        _async_mode = resolve_async_mode(mode or os.environ.get('BRAIN_AUTH_ASYNC_MODE', 'eventlet'))
+        monkey_patch(_async_mode)
+    return _async_mode
+
+class AsyncRuntime:
+    """Spawns tasks, runs blocking jobs and emits events on one concurrency model
+
+    Has the start_background_task/sleep/emit interface of a SocketIO
+    object, so background tasks written against Socket.IO can use it.
+    """
+
+    def __init__(self, socketio, mode, emit_queue_size=10000, poll_interval=0.005):
+        self.socketio = socketio
+        self.mode = mode
+        self.green = mode in GREEN_MODES
+        self.emit_queue_size = emit_queue_size
+        self.poll_interval = poll_interval  # Pickup delay for emits from foreign threads
+        self.events = deque()
+        self.lock = threading.Lock()
+        self.wakeup = socketio.server.eio.create_event()  # Native or green, matching the mode
+        self.server_thread = None  # Thread the drainer runs on
+        self.drainer = None
+        self.emitted = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def start_background_task(self, target, *args, **kwargs):
+        return self.socketio.start_background_task(target, *args, **kwargs)
+
+    def sleep(self, seconds=0):
+        self.socketio.sleep(seconds)
+
+    def spawn(self, target, name=None):
+        """Start a long-running task (e.g. an ESP32 ingest loop) and return its handle"""
+        if self.green:
+            return self.socketio.start_background_task(target)
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        return thread
+
+    @staticmethod
+    def task_alive(task):
+        """Whether a handle returned by spawn is still running"""
+        if task is None:
+            return False
+        if hasattr(task, 'is_alive'):
+            return task.is_alive()
+        greenlet = getattr(task, 'g', task)  # engineio wraps eventlet's GreenThread
+        return greenlet is not None and not greenlet.dead
+
+    def run_blocking(self, fn, *args, **kwargs):
+        """Run CPU-bound fn to completion without stalling the hub in green modes"""
+        if self.mode == 'eventlet':
+            from eventlet import tpool
+            return tpool.execute(fn, *args, **kwargs)
+        if self.mode == 'gevent':
+            import gevent
+            return gevent.get_hub().threadpool.apply(fn, args, kwargs)
+        return fn(*args, **kwargs)
+
+    def start(self):
+        """Start the emit queue's drainer; call from the server's thread"""
+        if self.drainer is None:
+            self.drainer = self.socketio.start_background_task(self._drain)
+
+    def emit(self, event, data=None, **kwargs):
+        """Queue a Socket.IO event; safe from any thread and never blocks
+
+        When the queue is full the oldest event is dropped.
+        """
+        with self.lock:
+            if len(self.events) >= self.emit_queue_size:
+                self.events.popleft()
+                self.dropped += 1
+            self.events.append((event, data, kwargs))
+        # Green events may only be set from the hub's own thread
+        if not self.green or threading.get_ident() == self.server_thread:
+            self.wakeup.set()
+
+    def _drain(self):
+        self.server_thread = threading.get_ident()
+        while True:
+            self.wakeup.wait(self.poll_interval if self.green else 1.0)
+            self.wakeup.clear()
+            while True:
+                with self.lock:
+                    if not self.events:
+                        break
+                    event, data, kwargs = self.events.popleft()
+                try:
+                    self.socketio.emit(event, data, **kwargs)
+                    self.emitted += 1
+                except Exception as e:
+                    self.errors += 1
+                    logger.error(f"Emitting {event} failed: {e}", extra={'msg_type': 'emit.error'})
+
+    def report(self):
+        with self.lock:
+            queued = len(self.events)
+        return {
+            'async_mode': self.mode,
+            'running': self.drainer is not None,
+            'queued': queued,
+            'queue_capacity': self.emit_queue_size,
+            'emitted': self.emitted,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'poll_interval_ms': self.poll_interval * 1000.0
+        }
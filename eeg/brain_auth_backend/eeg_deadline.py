@@ -0,0 +1,168 @@
+"""
+BrainID Neural Authentication System
+Deadline-aware Key Scheduling
+
+Key requests may carry a latency budget (deadline_ms). KeyScheduler keeps
+an exponentially weighted average of every pipeline stage's measured cost
+per configuration (rate, channels, spectral mode, consensus windows) and
+uses it to
+
+- admit or reject a request: when the predicted remaining cost of the
+  key jobs already in flight uses up the budget, the request is rejected
+  with a retry-after of the time that work needs to drain instead of
+  queueing behind it;
+- pick the most thorough configuration predicted to finish in time,
+  halving the consensus windows down to a single window;
+- fall back to the most recent precomputed key when no configuration
+  fits, and otherwise run the cheapest configuration anyway (the
+  response then reports the missed deadline).
+
+Configurations without measurements are assumed to fit, so the first
+request of each configuration measures it.
+"""
+
+import math
+import time
+from contextlib import contextmanager
+from threading import Lock
+
+# How a deadline-bound key request was served
+KEY_MODES = ('full', 'reduced', 'cached')
+
+class AdmissionRejected(Exception):
+    """Raised when queued key jobs alone exceed a request's deadline"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def consensus_ladder(consensus_windows):
+    """Consensus window counts to try, most thorough first (K, K/2, ..., 1)"""
+    ladder = []
+    windows = max(1, int(consensus_windows))
+    while windows > 1:
+        ladder.append(windows)
+        windows //= 2
+    ladder.append(1)
+    return ladder
+
+class KeyScheduler:
+    """Per-stage cost model, admission control and configuration choice for key jobs"""
+
+    def __init__(self, default_deadline_ms=0, max_cached_age_ms=10000, smoothing=0.2):
+        self.default_deadline_ms = default_deadline_ms  # 0 = no deadline unless requested
+        self.max_cached_age_ms = max_cached_age_ms
+        self.smoothing = smoothing
+        self.lock = Lock()
+        self.stage_costs = {}   # config key -> {stage: average ms}
+        self.in_flight = {}     # job id -> (predicted ms, monotonic start)
+        self.next_job = 0
+        self.rejected = 0
+        self.modes = dict.fromkeys(KEY_MODES, 0)
+
+    @staticmethod
+    def config_key(processor, consensus_windows):
+        return (processor.sample_rate, processor.num_channels, processor.spectral_mode, consensus_windows)
+
+    def predict(self, config_key):
+        """Predicted total ms for a configuration, or None if never measured"""
+        with self.lock:
+            costs = self.stage_costs.get(config_key)
+            return sum(costs.values()) if costs else None
+
+    def record(self, config_key, timings):
+        """Fold one key generation's per-stage timings into the cost model"""
+        with self.lock:
+            costs = self.stage_costs.setdefault(config_key, {})
+            for stage, ms in timings.items():
+                previous = costs.get(stage)
+                costs[stage] = ms if previous is None else previous + self.smoothing * (ms - previous)
+
+    def _queue_ms(self):
+        now = time.monotonic()
+        return sum(max(0.0, predicted - (now - started) * 1000.0) for predicted, started in self.in_flight.values())
+
+    def queue_ms(self):
+        """Predicted ms until the work already in flight has finished"""
+        with self.lock:
+            return self._queue_ms()
+
+    def choose(self, processor, consensus_windows, budget_ms, allow_cached=True):
+        """(mode, consensus_windows, predicted_ms) for a request with budget_ms left
+
+        Raises AdmissionRejected only if the work already queued uses up the
+        budget. mode is 'cached' when only a precomputed key can meet the
+        deadline (and allow_cached is set); if nothing fits, the cheapest
+        configuration runs and misses the deadline.
+        """
+        queued = self.queue_ms()
+        cached = allow_cached and self.cached_key_age_ms(processor) is not None
+        if queued > 0 and queued >= budget_ms:
+            if cached:
+                return 'cached', None, 0.0
+            with self.lock:
+                self.rejected += 1
+            retry_after = max(1, math.ceil(queued / 1000.0))
+            raise AdmissionRejected(
+                f"Queued key jobs need {queued:.0f} ms, more than the {max(budget_ms, 0.0):.0f} ms left "
+                f"before the deadline", retry_after
+            )
+
+        remaining = budget_ms - queued
+        ladder = consensus_ladder(consensus_windows)
+        predicted = None
+        for windows in ladder:
+            predicted = self.predict(self.config_key(processor, windows))
+            if predicted is None or predicted <= remaining:
+                break
+        else:
+            if cached:
+                return 'cached', None, 0.0
+        mode = 'full' if windows == ladder[0] else 'reduced'
+        return mode, windows, predicted or 0.0
+
+    def cached_key_age_ms(self, processor):
+        """Age of the processor's last key if it is recent enough to serve, else None"""
+        if processor.last_key is None or processor.last_key_time is None:
+            return None
+        age_ms = (time.time() - processor.last_key_time) * 1000.0
+        return age_ms if age_ms <= self.max_cached_age_ms else None
+
+    def count(self, mode):
+        with self.lock:
+            self.modes[mode] += 1
+
+    @contextmanager
+    def job(self, predicted_ms):
+        """Track a running key job's predicted cost for admission control"""
+        with self.lock:
+            job_id = self.next_job
+            self.next_job += 1
+            self.in_flight[job_id] = (predicted_ms, time.monotonic())
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.in_flight.pop(job_id, None)
+
+    def report(self):
+        with self.lock:
+            return {
+                'default_deadline_ms': self.default_deadline_ms,
+                'max_cached_age_ms': self.max_cached_age_ms,
+                'in_flight': len(self.in_flight),
+                'queue_ms': self._queue_ms(),
+                'rejected': self.rejected,
+                'modes': dict(self.modes),
+                'costs': [
+                    {
+                        'sample_rate': key[0],
+                        'num_channels': key[1],
+                        'spectral_mode': key[2],
+                        'consensus_windows': key[3],
+                        'stages_ms': dict(costs),
+                        'total_ms': sum(costs.values())
+                    }
+                    for key, costs in self.stage_costs.items()
+                ]
+            }
@@ -0,0 +1,235 @@
+"""
+BrainID Neural Authentication System
+Streaming Enrollment
+
+An enrollment watches a device session for a set duration and, every hop,
+runs the newest key window through the feature pipeline and folds the
+feature vector into per-feature running statistics (Welford's algorithm).
+No windows are stored, so memory is O(features) however long the
+enrollment runs. Windows overlap, so each sample is run through the
+pipeline about buffer_size / hop times (4 with a 2 s window and 0.5 s hop).
+
+The finished statistics become a UserTemplate: the per-feature enrolled
+mean and a per-feature tolerance width (tolerance_sigmas standard
+deviations either side of the mean, never narrower than the global
+tolerance step). Keys derived from a template quantize each feature with
+its own width instead of the global tolerance_percentage, so stable
+features keep fine resolution and noisy ones get wider bins. The bins
+are a fixed grid shifted so the enrolled mean sits at a bin centre: a
+feature within width/2 of the mean always lands in the mean's bin, and
+that bin's index (and so the key) depends on the user's actual feature
+values. The template stores the mean in plain text, so it must be kept
+as private as the keys:
+
+    enrollments/<user>.json   mean, width, windows, pipeline configuration
+"""
+
+import json
+import logging
+import os
+import time
+from threading import Lock
+
+import numpy as np
+
+from eeg_recording import safe_name
+
+logger = logging.getLogger(__name__)
+
+class RunningStats:
+    """Welford running mean/variance of fixed-length feature vectors"""
+
+    def __init__(self, num_features):
+        self.count = 0
+        self.mean = np.zeros(num_features)
+        self.m2 = np.zeros(num_features)  # Sum of squared deviations from the mean
+
+    def update(self, features):
+        """Fold in one (features,) vector or a (K, features) batch"""
+        batch = np.atleast_2d(np.asarray(features, dtype=float))
+        n = len(batch)
+        if n == 0:
+            return
+        batch_mean = batch.mean(axis=0)
+        batch_m2 = ((batch - batch_mean) ** 2).sum(axis=0)
+
+        # Chan et al. merge of (count, mean, m2) with the batch statistics
+        total = self.count + n
+        delta = batch_mean - self.mean
+        self.mean += delta * (n / total)
+        self.m2 += batch_m2 + delta ** 2 * (self.count * n / total)
+        self.count = total
+
+    @property
+    def variance(self):
+        """Sample variance (zero until two vectors have been seen)"""
+        if self.count < 2:
+            return np.zeros_like(self.m2)
+        return self.m2 / (self.count - 1)
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+class UserTemplate:
+    """Per-feature enrolled mean and tolerance width for one user"""
+
+    def __init__(self, user_id, mean, width, windows, config, created_at=None):
+        self.user_id = user_id
+        self.mean = np.asarray(mean, dtype=float)
+        self.width = np.asarray(width, dtype=float)
+        self.windows = windows
+        self.config = config  # Pipeline settings the features were computed with
+        self.created_at = created_at or time.time()
+
+    @classmethod
+    def from_stats(cls, user_id, stats, config, tolerance_sigmas=3.0, min_width=0.15):
+        width = np.maximum(2.0 * tolerance_sigmas * stats.std, min_width)
+        return cls(user_id, stats.mean.copy(), width, stats.count, config)
+
+    def check_config(self, config):
+        """Raise ValueError if features computed with config cannot use this template"""
+        mismatched = [name for name, value in self.config.items() if config.get(name) != value]
+        if mismatched:
+            raise ValueError(f"Template for {self.user_id} was enrolled with different {', '.join(mismatched)}")
+
+    def quantize(self, features):
+        """Bin index of each feature; within width/2 of the mean gives the mean's bin"""
+        # The offset is the mean's own bin on the unshifted grid, so matching
+        # features do not all quantize to 0 (which would hash to one key for
+        # every user). + 0.0 folds -0.0 into 0.0 so equal bins hash alike.
+        offset = np.round(self.mean / self.width)
+        return np.round((features - self.mean) / self.width) + offset + 0.0
+
+    def to_dict(self):
+        return {
+            'user_id': self.user_id,
+            'mean': self.mean.tolist(),
+            'width': self.width.tolist(),
+            'windows': self.windows,
+            'config': self.config,
+            'created_at': self.created_at
+        }
+
+    def summary(self):
+        return {
+            'user_id': self.user_id,
+            'windows': self.windows,
+            'features': len(self.mean),
+            'median_width': float(np.median(self.width)),
+            'created_at': self.created_at
+        }
+
+class TemplateStore:
+    """User templates as JSON files in a directory"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, user_id):
+        return os.path.join(self.root, f"{safe_name(user_id)}.json")
+
+    def save(self, template):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self.path(template.user_id) + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(template.to_dict(), f)
+        os.replace(tmp_path, self.path(template.user_id))
+
+    def load(self, user_id):
+        """The user's template, or None if not enrolled"""
+        try:
+            with open(self.path(user_id)) as f:
+                return UserTemplate(**json.load(f))
+        except FileNotFoundError:
+            return None
+
+class Enrollment:
+    """Streams one session's key windows into RunningStats for a set duration"""
+
+    def __init__(self, user_id, session, duration=30.0, hop=0.5, tolerance_sigmas=3.0):
+        self.user_id = user_id
+        self.session = session
+        self.duration = duration
+        self.hop = hop
+        self.tolerance_sigmas = tolerance_sigmas
+        self.stats = None
+        self.template = None
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self.last_seq = None
+        self.lock = Lock()
+
+    @property
+    def done(self):
+        return self.finished_at is not None
+
+    def step(self, run_blocking=None):
+        """Fold the newest window into the statistics if a hop of new samples arrived
+
+        run_blocking(fn, *args) runs the feature pipeline (e.g. off a green
+        hub); by default it runs inline.
+        """
+        processor = self.session.processor
+        hop_samples = max(1, int(self.hop * processor.sample_rate))
+        sample_seq = processor.sample_seq
+        if self.last_seq is not None and sample_seq - self.last_seq < hop_samples:
+            return False
+        if not processor.get_buffer_status():
+            return False
+
+        if run_blocking is None:
+            features = self._features(processor)
+        else:
+            features = run_blocking(self._features, processor)
+        with self.lock:
+            if self.stats is None:
+                self.stats = RunningStats(len(features))
+            self.stats.update(features)
+        self.last_seq = sample_seq
+        return True
+
+    @staticmethod
+    def _features(processor):
+        return processor.extract_features(processor.take_snapshot(processor.buffer_size))
+
+    def run(self, sleep=time.sleep, run_blocking=None):
+        """Collect windows for duration seconds, then build the template"""
+        self.started_at = time.time()
+        poll = min(self.hop, 0.1)
+        try:
+            while time.time() - self.started_at < self.duration:
+                self.step(run_blocking)
+                sleep(poll)
+            if self.stats is None or self.stats.count < 2:
+                raise ValueError('Not enough data during enrollment (is the device streaming?)')
+            processor = self.session.processor
+            self.template = UserTemplate.from_stats(
+                self.user_id, self.stats, processor.template_config(),
+                tolerance_sigmas=self.tolerance_sigmas,
+                min_width=processor.tolerance_percentage / 100.0
+            )
+        except Exception as e:
+            logger.error(f"Enrollment of {self.user_id} failed: {e}")
+            self.error = str(e)
+        self.finished_at = time.time()
+        return self.template
+
+    def progress(self):
+        with self.lock:
+            windows = self.stats.count if self.stats is not None else 0
+        elapsed = (self.finished_at or time.time()) - self.started_at if self.started_at else 0.0
+        progress = {
+            'user_id': self.user_id,
+            'device_id': self.session.device_id,
+            'status': 'failed' if self.error else 'complete' if self.done else 'enrolling',
+            'windows': windows,
+            'elapsed_seconds': elapsed,
+            'duration_seconds': self.duration
+        }
+        if self.error:
+            progress['message'] = self.error
+        if self.template is not None:
+            progress['template'] = self.template.summary()
+        return progress
@@ -0,0 +1,188 @@
+"""
+BrainID Neural Authentication System
+Non-blocking Logging
+
+All log records go through a QueueHandler into a bounded queue and are
+written by a QueueListener thread, so the ingest path never waits on a
+file or the console. Records tagged with a message type
+(extra={'msg_type': ...}) are rate limited per type with a token bucket
+and can be sampled (keep one in N); dropped records are counted and the
+count is appended to the next record of that type that gets through.
+Levels, limits and sampling can be changed at runtime through LogControl.
+"""
+
+import atexit
+import logging
+import queue
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+from threading import Lock
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+def parse_level(level):
+    """Logging level from a name ('debug', 'INFO') or number"""
+    if isinstance(level, int) or str(level).isdigit():
+        return int(level)
+    value = logging.getLevelName(str(level).upper())
+    if not isinstance(value, int):
+        raise ValueError(f"Unknown log level: {level}")
+    return value
+
+class RateLimitFilter(logging.Filter):
+    """Per-message-type token bucket rate limiting and 1-in-N sampling
+
+    Records without a msg_type attribute always pass. A rate of 0 (or None)
+    disables limiting for that type.
+    """
+
+    def __init__(self, default_rate=10.0, burst=20):
+        super().__init__()
+        self.default_rate = default_rate
+        self.burst = burst
+        self.rates = {}     # msg_type -> messages per second
+        self.sampling = {}  # msg_type -> keep one record in N
+        self.state = {}     # msg_type -> [tokens, last_refill, seen, dropped, total_dropped]
+        self.lock = Lock()
+
+    def filter(self, record):
+        msg_type = getattr(record, 'msg_type', None)
+        if msg_type is None:
+            return True
+
+        with self.lock:
+            state = self.state.get(msg_type)
+            now = time.monotonic()
+            if state is None:
+                state = self.state[msg_type] = [float(self.burst), now, 0, 0, 0]
+            state[2] += 1
+
+            every = self.sampling.get(msg_type, 1)
+            allowed = every <= 1 or (state[2] - 1) % every == 0
+            rate = self.rates.get(msg_type, self.default_rate)
+            if allowed and rate:
+                state[0] = min(float(self.burst), state[0] + (now - state[1]) * rate)
+                state[1] = now
+                if state[0] >= 1.0:
+                    state[0] -= 1.0
+                else:
+                    allowed = False
+
+            if not allowed:
+                state[3] += 1
+                state[4] += 1
+                return False
+            dropped, state[3] = state[3], 0
+
+        if dropped:
+            record.msg = f"{record.getMessage()} ({dropped} similar messages suppressed)"
+            record.args = None
+        return True
+
+    def configure(self, rates=None, sampling=None, default_rate=None):
+        with self.lock:
+            if default_rate is not None:
+                self.default_rate = float(default_rate)
+            for msg_type, rate in (rates or {}).items():
+                self.rates[msg_type] = float(rate)
+            for msg_type, every in (sampling or {}).items():
+                self.sampling[msg_type] = max(1, int(every))
+
+    def report(self):
+        with self.lock:
+            return {
+                'default_rate': self.default_rate,
+                'burst': self.burst,
+                'rates': dict(self.rates),
+                'sampling': dict(self.sampling),
+                'types': {
+                    msg_type: {'seen': state[2], 'dropped': state[4]}
+                    for msg_type, state in self.state.items()
+                }
+            }
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class LogControl:
+    """Owns the log queue, its writer thread and the rate limits"""
+
+    def __init__(self, level=logging.INFO, log_file=None, queue_size=10000, default_rate=10.0, burst=20,
+                 fmt=LOG_FORMAT):
+        formatter = logging.Formatter(fmt)
+        handlers = [logging.StreamHandler(sys.stdout)]
+        if log_file:
+            handlers.append(logging.FileHandler(log_file))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        self.log_file = log_file
+        self.queue = queue.Queue(queue_size)
+        self.rate_filter = RateLimitFilter(default_rate, burst)
+        self.handler = NonBlockingQueueHandler(self.queue)
+        self.handler.addFilter(self.rate_filter)
+        self.listener = QueueListener(self.queue, *handlers, respect_handler_level=True)
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(self.handler)
+        root.setLevel(parse_level(level))
+
+        self.listener.start()
+        self.running = True
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Flush queued records and stop the writer thread"""
+        if self.running:
+            self.running = False
+            self.listener.stop()
+
+    def set_levels(self, level=None, loggers=None):
+        """Set the root level and/or {logger_name: level} overrides"""
+        if level is not None:
+            logging.getLogger().setLevel(parse_level(level))
+        for name, logger_level in (loggers or {}).items():
+            logging.getLogger(name).setLevel(parse_level(logger_level))
+
+    def report(self):
+        loggers = {
+            name: logging.getLevelName(logger.level)
+            for name, logger in logging.Logger.manager.loggerDict.items()
+            if isinstance(logger, logging.Logger) and logger.level != logging.NOTSET
+        }
+        report = self.rate_filter.report()
+        report.update({
+            'level': logging.getLevelName(logging.getLogger().level),
+            'loggers': loggers,
+            'log_file': self.log_file,
+            'queue_size': self.queue.qsize(),
+            'queue_capacity': self.queue.maxsize,
+            'queue_dropped': self.handler.dropped
+        })
+        return report
+
+_log_control = None
+
+def configure_logging(**kwargs):
+    """Install queue-based logging once and return its LogControl
+
+    Later calls return the existing LogControl, so the startup script can
+    choose the log file before the server module configures logging.
+    """
+    global _log_control
+    if _log_control is None:
+        _log_control = LogControl(**kwargs)
+    return _log_control
@@ -0,0 +1,441 @@
+"""
+BrainID Neural Authentication System
+Key Processing Pipeline
+
+The DSP that turns a (channels, samples) window into a brain key, as a
+chain of registered stages:
+
+    filter     (channels, ..., samples)        -> (bands, channels, ..., samples)
+    features   (bands, channels, ..., samples) -> (..., channels * bands * 7)
+    normalize  (..., features)                 -> (..., features)
+    quantize   (..., features)                 -> (..., features)
+    hash       (features,)                     -> 2KB base64 key
+
+filter followed by band_power ((bands, channels, ..., samples) ->
+(channels, ..., bands)) gives the per-channel band powers streamed to
+dashboards.
+
+compile_plan() validates a stage chain against an input shape once per
+configuration, precomputes filter coefficients and frequency grids,
+preallocates every intermediate array and caches the resulting plan; each
+run() reuses those buffers and reports per-stage timings. Stages that treat
+channels independently (filter, features, band_power) are split into channel blocks
+run on a shared thread pool (set_dsp_threads); SciPy's filters and FFTs
+release the GIL, so wide montages are processed in parallel. Both
+brain_auth_server.py copies import this module, so faster stages can be
+registered here instead of forking the servers.
+"""
+
+import base64
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+import numpy as np
+from scipy import signal
+from scipy.fft import fft, fftfreq
+
+logger = logging.getLogger(__name__)
+
+# Spectrum estimators selectable through PipelineConfig.spectral_mode
+SPECTRAL_MODES = ('fft', 'welch')
+
+# Per-band features produced by the features stage, in order
+FEATURE_NAMES = (
+    'mean_power', 'peak_freq', 'peak_power', 'power_ratio',
+    'spectral_centroid', 'spectral_rolloff', 'spectral_flux'
+)
+
+DEFAULT_FREQUENCY_BANDS = {
+    'delta': (0.5, 4.0),
+    'theta': (4.0, 8.0),
+    'alpha': (8.0, 12.0),
+    'beta': (12.0, 30.0),
+    'gamma': (30.0, 50.0)
+}
+
+# Stages up to (and including) normalization, and the full key pipeline
+FEATURE_STAGES = ('filter', 'features', 'normalize')
+KEY_STAGES = FEATURE_STAGES + ('quantize', 'hash')
+# Per-channel band powers for live displays
+BAND_POWER_STAGES = ('filter', 'band_power')
+
+STAGES = {}
+
+# Shared pool for channel-parallel stages (1 thread runs stages inline)
+DSP_THREADS = 1
+# Smallest channel block worth handing to a pool thread
+MIN_BLOCK_CHANNELS = 4
+_dsp_executor = None
+_dsp_executor_lock = Lock()
+
+def set_dsp_threads(threads):
+    """Set the number of threads channel-parallel stages are split across"""
+    global DSP_THREADS, _dsp_executor
+    threads = max(1, int(threads))
+    with _dsp_executor_lock:
+        if threads != DSP_THREADS and _dsp_executor is not None:
+            _dsp_executor.shutdown(wait=False)
+            _dsp_executor = None
+        DSP_THREADS = threads
+
+def dsp_executor():
+    global _dsp_executor
+    with _dsp_executor_lock:
+        if _dsp_executor is None:
+            _dsp_executor = ThreadPoolExecutor(max_workers=DSP_THREADS, thread_name_prefix='dsp')
+        return _dsp_executor
+
+def channel_blocks(num_channels, threads=None):
+    """Split range(num_channels) into at most threads contiguous slices"""
+    threads = DSP_THREADS if threads is None else threads
+    n_blocks = max(1, min(threads, num_channels // MIN_BLOCK_CHANNELS))
+    bounds = np.linspace(0, num_channels, n_blocks + 1).astype(int).tolist()
+    return [slice(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+def register_stage(name):
+    """Class decorator adding a Stage subclass to the registry under name"""
+    def decorator(cls):
+        cls.name = name
+        STAGES[name] = cls
+        return cls
+    return decorator
+
+class PipelineConfig:
+    """Everything a compiled plan depends on"""
+
+    def __init__(self, sample_rate, num_channels, frequency_bands=None, spectral_mode='fft',
+                 tolerance_percentage=15.0, filter_order=4):
+        if spectral_mode not in SPECTRAL_MODES:
+            raise ValueError(f"Unknown spectral mode: {spectral_mode}")
+        self.sample_rate = sample_rate
+        self.num_channels = num_channels
+        self.frequency_bands = dict(frequency_bands or DEFAULT_FREQUENCY_BANDS)
+        self.spectral_mode = spectral_mode
+        self.tolerance_percentage = tolerance_percentage
+        self.filter_order = filter_order
+
+    @property
+    def key(self):
+        return (
+            self.sample_rate, self.num_channels, tuple(self.frequency_bands.items()),
+            self.spectral_mode, self.tolerance_percentage, self.filter_order
+        )
+
+class Stage:
+    """A pipeline step with a declared output shape and a preallocated output"""
+
+    name = None
+    # Timing label reported by ExecutionPlan.run
+    label = None
+    # Channel-parallel stages implement run_channels and may run in blocks
+    channel_parallel = False
+
+    def __init__(self, config, input_shape):
+        self.config = config
+        self.input_shape = tuple(input_shape)
+        self.check_input(self.input_shape)
+        self.output_shape = self.compute_output_shape(self.input_shape)
+        self.out = np.empty(self.output_shape) if self.output_shape is not None else None
+
+    def check_input(self, shape):
+        """Raise ValueError if this stage cannot take input of this shape"""
+
+    def compute_output_shape(self, shape):
+        """Output shape for the given input shape (None for non-array output)"""
+        return shape
+
+    def run(self, x):
+        """Process x, writing into self.out where possible, and return the output"""
+        if self.channel_parallel:
+            self.run_channels(x, slice(None))
+            return self.out
+        raise NotImplementedError
+
+    def run_channels(self, x, channels):
+        """Process the channels slice of x into the matching part of self.out"""
+        raise NotImplementedError
+
+@register_stage('filter')
+class BandpassFilterStage(Stage):
+    """Zero-phase Butterworth bandpass per frequency band"""
+
+    label = 'band_filtering'
+    channel_parallel = True
+
+    def check_input(self, shape):
+        if len(shape) < 2 or shape[0] != self.config.num_channels:
+            raise ValueError(f"filter expects ({self.config.num_channels}, ..., samples), got {shape}")
+
+    def compute_output_shape(self, shape):
+        return (len(self.config.frequency_bands),) + shape
+
+    def __init__(self, config, input_shape):
+        super().__init__(config, input_shape)
+        nyquist = config.sample_rate / 2
+        self.coefficients = []
+        for band_name, (low_freq, high_freq) in config.frequency_bands.items():
+            try:
+                coefficients = signal.butter(config.filter_order, [low_freq / nyquist, high_freq / nyquist], btype='band')
+            except ValueError as e:
+                # Bands outside the Nyquist range pass the data through unchanged
+                logger.warning(f"Band {band_name} unusable at {config.sample_rate} Hz ({e}), passing data through")
+                coefficients = None
+            self.coefficients.append(coefficients)
+
+    def run_channels(self, x, channels):
+        x = x[channels]
+        for i, coefficients in enumerate(self.coefficients):
+            if coefficients is None:
+                self.out[i, channels] = x
+            else:
+                self.out[i, channels] = signal.filtfilt(coefficients[0], coefficients[1], x, axis=-1)
+
+class SpectrumStage(Stage):
+    """Base for stages working on the spectrum of band-filtered (bands, channels, ..., samples) input"""
+
+    channel_parallel = True
+
+    def __init__(self, config, input_shape):
+        super().__init__(config, input_shape)
+        n_samples = input_shape[-1]
+        if config.spectral_mode == 'welch':
+            self.nperseg = min(n_samples, int(config.sample_rate))
+            self.freqs = signal.welch(np.zeros(n_samples), fs=config.sample_rate, nperseg=self.nperseg)[0]
+        else:
+            self.freqs = fftfreq(n_samples, 1 / config.sample_rate)[:n_samples // 2]
+
+    def check_input(self, shape):
+        if len(shape) < 3:
+            raise ValueError(f"{self.name} expects (bands, channels, ..., samples), got {shape}")
+
+    def spectrum(self, x):
+        """FFT magnitude, or Welch power spectral density, along the last axis"""
+        if self.config.spectral_mode == 'welch':
+            return signal.welch(x, fs=self.config.sample_rate, nperseg=self.nperseg, axis=-1)[1]
+        n_samples = x.shape[-1]
+        return np.abs(fft(x, axis=-1)[..., :n_samples // 2])
+
+@register_stage('features')
+class SpectralFeatureStage(SpectrumStage):
+    """Seven spectral features per band and channel, ordered channel, band, feature"""
+
+    label = 'fft_features'
+
+    def compute_output_shape(self, shape):
+        bands, channels, batch, samples = shape[0], shape[1], shape[2:-1], shape[-1]
+        return batch + (channels * bands * len(FEATURE_NAMES),)
+
+    def __init__(self, config, input_shape):
+        super().__init__(config, input_shape)
+        # (bands, channels, ..., features) buffer, reordered into self.out
+        self.features = np.empty(input_shape[:-1] + (len(FEATURE_NAMES),))
+
+    def run_channels(self, x, channels):
+        freqs = self.freqs
+        magnitude = self.spectrum(x[:, channels])
+        features = self.features[:, channels]
+        total_power = np.sum(magnitude, axis=-1)
+
+        np.mean(magnitude, axis=-1, out=features[..., 0])                                # mean_power
+        features[..., 1] = freqs[np.argmax(magnitude, axis=-1)]                          # peak_freq
+        np.max(magnitude, axis=-1, out=features[..., 2])                                 # peak_power
+        np.divide(np.sum(magnitude[..., :10], axis=-1), total_power, out=features[..., 3])  # power_ratio (low/total)
+        np.divide(np.sum(freqs * magnitude, axis=-1), total_power, out=features[..., 4])    # spectral_centroid
+        features[..., 5] = spectral_rolloff(freqs, magnitude)                            # spectral_rolloff
+        np.sum(np.diff(magnitude, axis=-1) ** 2, axis=-1, out=features[..., 6])          # spectral_flux
+
+        # (bands, channels, ..., F) -> (..., channels, bands, F) -> (..., channels * bands * F)
+        ordered = np.moveaxis(np.moveaxis(features, 0, -2), 0, -3)
+        start, stop, _ = channels.indices(x.shape[1])
+        width = x.shape[0] * len(FEATURE_NAMES)
+        self.out[..., start * width:stop * width] = ordered.reshape(ordered.shape[:-3] + (-1,))
+
+@register_stage('band_power')
+class BandPowerStage(SpectrumStage):
+    """Mean power of each band-filtered signal, as (channels, ..., bands)
+
+    Power is integrated from the spectrum (Parseval), so it is the mean
+    squared amplitude of the band. Bands outside the Nyquist range are NaN.
+    """
+
+    label = 'band_power'
+
+    def compute_output_shape(self, shape):
+        return shape[1:-1] + (shape[0],)
+
+    def __init__(self, config, input_shape):
+        super().__init__(config, input_shape)
+        nyquist = config.sample_rate / 2
+        self.usable = np.array([
+            0 < low_freq < high_freq < nyquist for low_freq, high_freq in config.frequency_bands.values()
+        ])
+
+    def run_channels(self, x, channels):
+        magnitude = self.spectrum(x[:, channels])
+        if self.config.spectral_mode == 'welch':
+            power = np.sum(magnitude, axis=-1) * (self.freqs[1] - self.freqs[0])
+        else:
+            power = 2.0 * np.sum(magnitude ** 2, axis=-1) / x.shape[-1] ** 2
+        power[~self.usable] = np.nan
+        self.out[channels] = np.moveaxis(power, 0, -1)
+
+@register_stage('normalize')
+class NormalizeStage(Stage):
+    """Z-score each feature vector after replacing NaN/inf"""
+
+    label = 'normalization'
+
+    def run(self, x):
+        out = self.out
+        out[...] = np.nan_to_num(x, nan=0.0, posinf=1e6, neginf=-1e6)
+        mean = np.mean(out, axis=-1, keepdims=True)
+        std = np.std(out, axis=-1, keepdims=True)
+        valid = std > 0
+        out -= np.where(valid, mean, 0.0)
+        out /= np.where(valid, std, 1.0)
+        return out
+
+@register_stage('quantize')
+class QuantizeStage(Stage):
+    """Round features to steps of tolerance_percentage / 100"""
+
+    label = 'quantization'
+
+    def run(self, x):
+        scale_factor = 100.0 / self.config.tolerance_percentage  # Higher values = less tolerance
+        np.multiply(x, scale_factor, out=self.out)
+        np.round(self.out, out=self.out)
+        self.out /= scale_factor
+        return self.out
+
+@register_stage('hash')
+class HashStage(Stage):
+    """Layered hashes of one feature vector, as a 2KB base64 key"""
+
+    label = 'hashing'
+
+    def check_input(self, shape):
+        if len(shape) != 1:
+            raise ValueError(f"hash expects a single feature vector, got {shape}")
+
+    def compute_output_shape(self, shape):
+        return None
+
+    def run(self, x):
+        return create_hash_key(x)
+
+def spectral_rolloff(freqs, magnitude, rolloff_percent=0.85):
+    """Frequency below which rolloff_percent of the magnitude lies, along the last axis"""
+    total_power = np.sum(magnitude, axis=-1, keepdims=True)
+    cumulative_power = np.cumsum(magnitude, axis=-1)
+    reached = cumulative_power >= rolloff_percent * total_power
+    rolloff_idx = np.argmax(reached, axis=-1)
+
+    return np.where(np.any(reached, axis=-1), freqs[rolloff_idx], freqs[-1])
+
+def apply_tolerance(features, tolerance_percent):
+    """Apply tolerance to features for consistent key generation"""
+    scale_factor = 100.0 / tolerance_percent  # Higher values = less tolerance
+    return np.round(features * scale_factor) / scale_factor
+
+def create_hash_key(features):
+    """Create a 2KB hash key from features"""
+    # Convert features to bytes
+    feature_bytes = features.tobytes()
+
+    # Create multiple hash layers for 2KB output
+    hash_layers = [
+        hashlib.sha256(feature_bytes).digest(),
+        hashlib.md5(feature_bytes).digest(),
+        hashlib.sha1(feature_bytes).digest(),
+        hashlib.sha512(feature_bytes).digest()[:64],
+        hashlib.blake2b(feature_bytes, digest_size=32).digest()
+    ]
+
+    # Additional entropy from features
+    for i in range(0, len(features), 10):
+        hash_layers.append(hashlib.sha256(features[i:i+10].tobytes()).digest())
+
+    # Combine all hashes
+    combined_hash = b''.join(hash_layers)
+
+    # Ensure exactly 2KB (2048 bytes), padding with repeated hashing
+    while len(combined_hash) < 2048:
+        combined_hash += hashlib.sha256(combined_hash).digest()
+    combined_hash = combined_hash[:2048]
+
+    # Convert to base64 for transmission
+    return base64.b64encode(combined_hash).decode('utf-8')
+
+class ExecutionPlan:
+    """A validated stage chain with preallocated intermediates for one input shape"""
+
+    def __init__(self, config, stage_names, input_shape):
+        self.config = config
+        self.input_shape = tuple(input_shape)
+        self.stages = []
+        shape = self.input_shape
+        for name in stage_names:
+            if name not in STAGES:
+                raise ValueError(f"Unknown pipeline stage: {name}")
+            if shape is None:
+                raise ValueError(f"Stage {name} cannot follow {self.stages[-1].name}")
+            stage = STAGES[name](config, shape)
+            self.stages.append(stage)
+            shape = stage.output_shape
+        self.output_shape = shape
+        # Intermediate buffers are shared between runs
+        self.lock = Lock()
+
+    def run(self, x, timings=None):
+        """Run every stage on x, returning a copy of the final output
+
+        If a timings dict is passed, it is filled with each stage's duration
+        in ms under the stage's label.
+        """
+        x = np.asarray(x, dtype=float)
+        if x.shape != self.input_shape:
+            raise ValueError(f"Plan compiled for input {self.input_shape}, got {x.shape}")
+        blocks = channel_blocks(self.config.num_channels)
+        with self.lock:
+            for stage in self.stages:
+                started = time.perf_counter()
+                if stage.channel_parallel and len(blocks) > 1:
+                    executor = dsp_executor()
+                    for future in [executor.submit(stage.run_channels, x, block) for block in blocks]:
+                        future.result()
+                    x = stage.out
+                else:
+                    x = stage.run(x)
+                if timings is not None:
+                    timings[stage.label] = (time.perf_counter() - started) * 1000.0
+            return x.copy() if isinstance(x, np.ndarray) else x
+
+    def describe(self):
+        return [
+            {'stage': stage.name, 'input_shape': stage.input_shape, 'output_shape': stage.output_shape}
+            for stage in self.stages
+        ]
+
+# Most recently used compiled plans
+PLAN_CACHE_SIZE = 64
+_plan_cache = OrderedDict()
+_plan_cache_lock = Lock()
+
+def compile_plan(config, stage_names, input_shape):
+    """Cached ExecutionPlan for (config, stages, input shape)"""
+    cache_key = (config.key, tuple(stage_names), tuple(input_shape))
+    with _plan_cache_lock:
+        plan = _plan_cache.get(cache_key)
+        if plan is None:
+            plan = ExecutionPlan(config, stage_names, input_shape)
+            _plan_cache[cache_key] = plan
+            if len(_plan_cache) > PLAN_CACHE_SIZE:
+                _plan_cache.popitem(last=False)
+        else:
+            _plan_cache.move_to_end(cache_key)
+        return plan
@@ -0,0 +1,189 @@
+"""
+BrainID Neural Authentication System
+Session Recording and Export
+
+Sessions are recorded as raw little-endian float32 sample files with a JSON
+sidecar, so they can be appended to cheaply on the ingest path and
+memory-mapped for export without loading them into RAM:
+
+    recordings/<device>/<session>.f32   (n_samples, num_channels) float32
+    recordings/<device>/<session>.json  sample_rate, num_channels, montage, started_at
+
+Export writers turn any (n_samples, n_channels) array-like into a lazy
+stream of byte chunks in .npy, Arrow IPC or CSV format.
+"""
+
+import io
+import json
+import os
+import re
+import time
+from threading import Lock
+
+import numpy as np
+
+# Rows per exported chunk
+EXPORT_CHUNK_SAMPLES = 4096
+
+EXPORT_FORMATS = {
+    'npy': ('application/octet-stream', 'npy'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrow'),
+    'csv': ('text/csv', 'csv')
+}
+
+SAMPLE_DTYPE = np.dtype('<f4')
+
+def safe_name(name):
+    """Make a device or session id safe to use as a path component"""
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', str(name)).strip('.') or 'unknown'
+
+class SessionRecorder:
+    """Appends incoming samples of one device session to a .f32 file"""
+
+    def __init__(self, root, device, sample_rate, num_channels, flush_every=100, montage=None):
+        self.device = safe_name(device)
+        self.session = time.strftime('%Y%m%d-%H%M%S')
+        self.sample_rate = sample_rate
+        self.num_channels = num_channels
+        self.flush_every = flush_every
+        self.lock = Lock()
+        self.samples_written = 0
+
+        directory = os.path.join(root, self.device)
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{self.session}.f32")
+        with open(os.path.join(directory, f"{self.session}.json"), 'w') as f:
+            json.dump({
+                'device': self.device,
+                'session': self.session,
+                'sample_rate': sample_rate,
+                'num_channels': num_channels,
+                'montage': montage,
+                'started_at': time.time()
+            }, f)
+        self.file = open(self.path, 'ab')
+
+    def append(self, samples):
+        """Append one sample or an (n_samples, num_channels) block"""
+        block = np.asarray(samples, dtype=SAMPLE_DTYPE).reshape(-1, self.num_channels)
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.write(block.tobytes())
+            self.samples_written += len(block)
+            if self.samples_written % self.flush_every < len(block):
+                self.file.flush()
+
+    def flush(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+def list_recordings(root, device=None):
+    """Return metadata dicts for all recorded sessions, oldest first"""
+    recordings = []
+    if not os.path.isdir(root):
+        return recordings
+    devices = [safe_name(device)] if device else sorted(os.listdir(root))
+    for device_name in devices:
+        directory = os.path.join(root, device_name)
+        if not os.path.isdir(directory):
+            continue
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith('.json'):
+                with open(os.path.join(directory, filename)) as f:
+                    meta = json.load(f)
+                meta['path'] = os.path.join(directory, filename[:-5] + '.f32')
+                recordings.append(meta)
+    return recordings
+
+def open_recording(meta):
+    """Memory-map a recorded session as an (n_samples, num_channels) array"""
+    row_bytes = SAMPLE_DTYPE.itemsize * meta['num_channels']
+    n_samples = os.path.getsize(meta['path']) // row_bytes if os.path.exists(meta['path']) else 0
+    if n_samples == 0:
+        return np.empty((0, meta['num_channels']), dtype=SAMPLE_DTYPE)
+    return np.memmap(meta['path'], dtype=SAMPLE_DTYPE, mode='r', shape=(n_samples, meta['num_channels']))
+
+def select_range(data, sample_rate, start=None, end=None, channels=None):
+    """Slice data by time (seconds from the first sample) without copying
+
+    Returns (data, channels, first_index); channel selection is applied per
+    chunk so the selected range is never copied as a whole.
+    """
+    first = max(0, int(round(start * sample_rate))) if start is not None else 0
+    last = min(len(data), int(round(end * sample_rate))) if end is not None else len(data)
+    if channels is None:
+        channels = range(data.shape[1])
+    return data[first:max(first, last)], list(channels), first
+
+def iter_chunks(data, channels):
+    """Yield contiguous float32 (chunk, len(channels)) blocks of data"""
+    for offset in range(0, len(data), EXPORT_CHUNK_SAMPLES):
+        chunk = np.asarray(data[offset:offset + EXPORT_CHUNK_SAMPLES])[:, channels]
+        yield offset, np.ascontiguousarray(chunk, dtype=SAMPLE_DTYPE)
+
+def stream_npy(data, channels):
+    """Stream data as a .npy file whose header declares the final shape"""
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(header, {
+        'descr': np.lib.format.dtype_to_descr(SAMPLE_DTYPE),
+        'fortran_order': False,
+        'shape': (len(data), len(channels))
+    })
+    yield header.getvalue()
+    for _, chunk in iter_chunks(data, channels):
+        yield chunk.tobytes()
+
+def stream_csv(data, channels, sample_rate, first_index=0, start_time=0.0):
+    """Stream data as CSV with a leading time column"""
+    yield 'time,' + ','.join(f"ch{channel}" for channel in channels) + '\n'
+    for offset, chunk in iter_chunks(data, channels):
+        times = start_time + (first_index + offset + np.arange(len(chunk))) / sample_rate
+        out = io.StringIO()
+        np.savetxt(out, np.column_stack([times, chunk]), delimiter=',', fmt='%.6f')
+        yield out.getvalue()
+
+def arrow_available():
+    """True if pyarrow is installed (Arrow IPC export is optional)"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def stream_arrow(data, channels, sample_rate, first_index=0, start_time=0.0):
+    """Stream data as an Arrow IPC stream, one record batch per chunk"""
+    import pyarrow as pa
+
+    schema = pa.schema(
+        [('time', pa.float64())] + [(f"ch{channel}", pa.float32()) for channel in channels]
+    )
+    sink = io.BytesIO()
+    writer = pa.ipc.new_stream(sink, schema)
+    for offset, chunk in iter_chunks(data, channels):
+        times = start_time + (first_index + offset + np.arange(len(chunk))) / sample_rate
+        writer.write_batch(pa.record_batch(
+            [pa.array(times)] + [pa.array(chunk[:, i]) for i in range(chunk.shape[1])],
+            schema=schema
+        ))
+        yield sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+    writer.close()
+    yield sink.getvalue()
+
+def stream_export(fmt, data, sample_rate, start=None, end=None, channels=None, start_time=0.0):
+    """Return a lazy byte/str generator exporting data in the given format"""
+    data, channels, first_index = select_range(data, sample_rate, start, end, channels)
+    if fmt == 'npy':
+        return stream_npy(data, channels)
+    if fmt == 'arrow':
+        return stream_arrow(data, channels, sample_rate, first_index, start_time)
+    return stream_csv(data, channels, sample_rate, first_index, start_time)
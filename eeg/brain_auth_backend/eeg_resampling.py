@@ -0,0 +1,96 @@
+"""
+BrainID Neural Authentication System
+Streaming Resampling
+
+Converts sample blocks from a device's native rate to the processing rate
+with a polyphase anti-aliasing FIR filter. Filter history and output phase
+are carried between calls, so feeding a stream one sample (or one block)
+at a time gives the same output as resampling it in one piece.
+"""
+
+from fractions import Fraction
+
+import numpy as np
+from scipy import signal
+
+class StreamingResampler:
+    """Polyphase resampler with carried state for (n_samples, n_channels) blocks"""
+
+    def __init__(self, input_rate, output_rate, num_channels, kaiser_beta=5.0):
+        ratio = Fraction(output_rate / input_rate).limit_denominator(1000)
+        self.input_rate = input_rate
+        self.output_rate = output_rate
+        self.num_channels = num_channels
+        self.up = ratio.numerator
+        self.down = ratio.denominator
+        self.passthrough = self.up == self.down
+        if self.passthrough:
+            return
+
+        # Same filter design as scipy.signal.resample_poly
+        max_rate = max(self.up, self.down)
+        half_len = 10 * max_rate
+        taps = signal.firwin(2 * half_len + 1, 1.0 / max_rate, window=('kaiser', kaiser_beta)) * self.up
+
+        # Polyphase matrix: phases[p, j] = taps[p + j * up]
+        self.taps_per_phase = -(-len(taps) // self.up)
+        padded = np.zeros(self.taps_per_phase * self.up)
+        padded[:len(taps)] = taps
+        self.phases = padded.reshape(self.taps_per_phase, self.up).T
+
+        self.reset()
+
+    def reset(self):
+        if self.passthrough:
+            return
+        # Input history, primed with zeros so the first outputs have full support
+        self.history = np.zeros((self.taps_per_phase - 1, self.num_channels))
+        self.history_start = -(self.taps_per_phase - 1)  # Input index of history[0]
+        self.next_output = 0  # Index of the next output sample
+
+    def get_state(self):
+        """Carried filter history and phase, as JSON-serializable values"""
+        if self.passthrough:
+            return None
+        return {
+            'history': self.history.tolist(),
+            'history_start': self.history_start,
+            'next_output': self.next_output
+        }
+
+    def set_state(self, state):
+        """Resume from get_state output"""
+        if self.passthrough or state is None:
+            return
+        self.history = np.asarray(state['history'], dtype=float).reshape(-1, self.num_channels)
+        self.history_start = state['history_start']
+        self.next_output = state['next_output']
+
+    def process(self, block):
+        """Resample the next block of input, returning all outputs it completes"""
+        block = np.asarray(block, dtype=float).reshape(-1, self.num_channels)
+        if self.passthrough:
+            return block
+
+        self.history = np.concatenate([self.history, block])
+        last_input = self.history_start + len(self.history) - 1
+
+        # Output m needs inputs up to floor(m * down / up)
+        n_outputs = max(0, (last_input * self.up) // self.down - self.next_output + 1)
+        if n_outputs == 0:
+            return np.empty((0, self.num_channels))
+
+        positions = (self.next_output + np.arange(n_outputs)) * self.down
+        newest = positions // self.up - self.history_start
+        phase = positions % self.up
+        # (n_outputs, taps_per_phase) indices into history, newest sample first
+        indices = newest[:, None] - np.arange(self.taps_per_phase)[None, :]
+        output = np.einsum('mk,mkc->mc', self.phases[phase], self.history[indices])
+
+        self.next_output += n_outputs
+        # Keep only the history the next output can still reach
+        first_needed = (self.next_output * self.down) // self.up - (self.taps_per_phase - 1)
+        drop = max(0, first_needed - self.history_start)
+        self.history = self.history[drop:]
+        self.history_start += drop
+        return output
@@ -0,0 +1,265 @@
+"""
+BrainID Neural Authentication System
+Device Sessions and Memory Accounting
+
+Each connected headset is a DeviceSession owning its processor, ingest
+client and thread, resampler and optional recorder. SessionManager tracks
+them, replaces (and closes) a session when the same device reconnects, and
+keeps the estimated worst-case memory of all sessions under a global budget
+by evicting the least recently active session or refusing new ones.
+LeakChecker diffs tracemalloc snapshots against a baseline for soak tests.
+"""
+
+import logging
+import sys
+import time
+import tracemalloc
+from collections import OrderedDict
+from threading import Lock, Thread
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BUDGET_POLICIES = ('evict', 'refuse')
+
+class MemoryBudgetExceeded(Exception):
+    """Raised when a session does not fit in the global memory budget"""
+
+class DeviceSession:
+    """A device's processor, ingest client/thread, resampler and recorder"""
+
+    def __init__(self, device_id, processor, client=None, recorder=None, resampler=None, pinned=False):
+        self.device_id = device_id
+        self.processor = processor
+        self.client = client
+        self.recorder = recorder
+        self.resampler = resampler  # Device rate -> processing rate
+        self.pinned = pinned  # Pinned sessions are never evicted
+        self.thread = None
+        self.runtime = None
+        self.lock = Lock()  # Serializes ingest and checkpoints
+        self.created_at = time.time()
+        self.last_activity = self.created_at
+
+    def start(self, target, runtime=None):
+        """Run target (usually client.connect) as the session's ingest task
+
+        With an AsyncRuntime (see eeg_concurrency.py) the task runs on the
+        server's concurrency model, otherwise on a daemon thread.
+        """
+        if runtime is not None:
+            self.thread = runtime.spawn(target, name=f"ingest-{self.device_id}")
+            self.runtime = runtime
+            return
+        self.thread = Thread(target=target, name=f"ingest-{self.device_id}", daemon=True)
+        self.thread.start()
+
+    def ingest_running(self):
+        if self.runtime is not None:
+            return self.runtime.task_alive(self.thread)
+        return self.thread is not None and self.thread.is_alive()
+
+    def touch(self):
+        self.last_activity = time.time()
+
+    def ingest(self, samples):
+        """Record a block at the device rate, then resample and buffer it"""
+        block = np.asarray(samples, dtype=float).reshape(len(samples), -1)
+        with self.lock:
+            if self.recorder is not None:
+                self.recorder.append(block)
+            if self.resampler is not None:
+                block = self.resampler.process(block)
+            if len(block):
+                self.processor.add_samples(block)
+        self.touch()
+
+    def checkpoint_state(self, buffers):
+        """Processor buffers (copied into buffers), resampler state and session metadata"""
+        with self.lock:
+            state = self.processor.checkpoint_state(buffers)
+            state['resampler'] = self.resampler.get_state() if self.resampler is not None else None
+        state.update({
+            'device_id': self.device_id,
+            'device_rate': self.resampler.input_rate if self.resampler is not None else self.processor.sample_rate,
+            'pinned': self.pinned,
+            'esp32_url': getattr(self.client, 'esp32_url', None),
+            'created_at': self.created_at,
+            'last_activity': self.last_activity
+        })
+        return state
+
+    def restore_checkpoint(self, state, buffers):
+        if self.resampler is not None and state['device_rate'] != self.resampler.input_rate:
+            raise ValueError(
+                f"Checkpoint device rate {state['device_rate']} Hz differs from the session's {self.resampler.input_rate} Hz"
+            )
+        with self.lock:
+            self.processor.restore_checkpoint(state, buffers)
+            if self.resampler is not None:
+                self.resampler.set_state(state.get('resampler'))
+        self.created_at = state['created_at']
+        self.last_activity = state['last_activity']
+
+    def close(self):
+        """Stop ingest and release the recorder"""
+        if self.client is not None:
+            self.client.close()
+        if self.recorder is not None:
+            self.recorder.close()
+
+    def capacity_bytes(self):
+        """Worst-case bytes once all buffers and histories are full"""
+        return self.processor.memory_usage()['capacity_bytes']
+
+    def memory_usage(self):
+        usage = dict(self.processor.memory_usage())
+        usage.update({
+            'device_id': self.device_id,
+            'threads': 1 if self.ingest_running() else 0,
+            'connected': bool(self.client is not None and self.client.connected),
+            'recording_samples': self.recorder.samples_written if self.recorder is not None else 0,
+            'device_rate': self.resampler.input_rate if self.resampler is not None else self.processor.sample_rate,
+            'processing_rate': self.processor.sample_rate,
+            'idle_seconds': time.time() - self.last_activity
+        })
+        return usage
+
+class SessionManager:
+    """Registry of device sessions under a global memory budget"""
+
+    def __init__(self, budget_bytes=0, policy='evict'):
+        if policy not in BUDGET_POLICIES:
+            raise ValueError(f"Unknown budget policy: {policy}")
+        self.budget_bytes = budget_bytes  # 0 disables the budget
+        self.policy = policy
+        self.sessions = OrderedDict()
+        self.lock = Lock()
+
+    def add(self, session):
+        """Register session, closing any previous session of the same device
+
+        The budget is checked first, so a refused session leaves the
+        previous one running.
+        """
+        with self.lock:
+            if self.budget_bytes:
+                self._make_room(session.capacity_bytes(), replacing=session.device_id)
+
+            previous = self.sessions.pop(session.device_id, None)
+            if previous is not None:
+                logger.info(f"Replacing session for {session.device_id}")
+                previous.close()
+            self.sessions[session.device_id] = session
+        return session
+
+    def _make_room(self, required, replacing=None):
+        """Evict (or refuse) until required bytes fit; replacing's session is not counted"""
+        others = [s for device_id, s in self.sessions.items() if device_id != replacing]
+        used = sum(s.capacity_bytes() for s in others)
+        if used + required <= self.budget_bytes:
+            return
+        if self.policy == 'refuse':
+            raise MemoryBudgetExceeded(
+                f"Session needs {required} bytes, {self.budget_bytes - used} of {self.budget_bytes} available"
+            )
+
+        candidates = sorted(
+            (s for s in others if not s.pinned),
+            key=lambda s: s.last_activity
+        )
+        for victim in candidates:
+            if used + required <= self.budget_bytes:
+                break
+            logger.warning(f"Memory budget exceeded, evicting session {victim.device_id}")
+            self.sessions.pop(victim.device_id)
+            victim.close()
+            used -= victim.capacity_bytes()
+        if used + required > self.budget_bytes:
+            raise MemoryBudgetExceeded(f"Session needs {required} bytes, budget is {self.budget_bytes}")
+
+    def get(self, device_id=None):
+        """Session for device_id, or the most recently added one"""
+        with self.lock:
+            if device_id is not None:
+                return self.sessions.get(device_id)
+            return next(reversed(self.sessions.values()), None)
+
+    def all(self):
+        with self.lock:
+            return list(self.sessions.values())
+
+    def find_recorder(self, path):
+        """The active recorder writing to path, if any"""
+        with self.lock:
+            for session in self.sessions.values():
+                if session.recorder is not None and session.recorder.path == path:
+                    return session.recorder
+        return None
+
+    def remove(self, device_id):
+        with self.lock:
+            session = self.sessions.pop(device_id, None)
+        if session is not None:
+            session.close()
+        return session
+
+    def memory_report(self):
+        with self.lock:
+            sessions = [s.memory_usage() for s in self.sessions.values()]
+        return {
+            'sessions': sessions,
+            'total_bytes': sum(s['used_bytes'] for s in sessions),
+            'total_capacity_bytes': sum(s['capacity_bytes'] for s in sessions),
+            'budget_bytes': self.budget_bytes,
+            'budget_policy': self.policy
+        }
+
+class LeakChecker:
+    """Reports memory growth since a tracemalloc baseline snapshot"""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.baseline = None
+        self.started_at = None
+
+    @property
+    def active(self):
+        return self.baseline is not None
+
+    def start(self, frames=10):
+        with self.lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+            self.baseline = tracemalloc.take_snapshot()
+            self.started_at = time.time()
+
+    def stop(self):
+        with self.lock:
+            self.baseline = None
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+
+    def report(self, limit=20):
+        with self.lock:
+            if self.baseline is None:
+                return {'active': False}
+            snapshot = tracemalloc.take_snapshot()
+            growth = [stat for stat in snapshot.compare_to(self.baseline, 'lineno') if stat.size_diff > 0]
+            current, peak = tracemalloc.get_traced_memory()
+            return {
+                'active': True,
+                'elapsed_seconds': time.time() - self.started_at,
+                'traced_bytes': current,
+                'peak_traced_bytes': peak,
+                'growth_bytes': sum(stat.size_diff for stat in growth),
+                'top_growth': [
+                    {'location': str(stat.traceback), 'size_diff': stat.size_diff, 'count_diff': stat.count_diff}
+                    for stat in growth[:limit]
+                ]
+            }
+
+def container_bytes(container, item_bytes):
+    """Approximate size of a container of fixed-size items"""
+    return sys.getsizeof(container) + len(container) * item_bytes
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+BrainID Neural Authentication System
+Parameter Sweep Tool
+
+Evaluates a grid of (tolerance, window length, sample rate, spectral mode)
+settings over labelled EEG recordings and reports key stability, FAR/FRR
+and compute cost per configuration.
+
+Recordings are laid out one directory per user:
+
+    recordings/
+        alice/session1.npy
+        alice/session2.csv
+        bob/20250101-120000.f32 (+ .json, as written by the server's recorder)
+
+Each file holds an (n_samples, n_channels) array recorded at --source-rate.
+Every recording must have --channels channels (default: the first
+recording's count); others are skipped with a warning. Features only
+depend on (window, rate, mode), so they are computed once per
+configuration, in fixed-size batches of windows so one compiled plan is
+reused for every recording, and reused for every tolerance;
+configurations are spread over a process pool.
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from fractions import Fraction
+from pathlib import Path
+
+import numpy as np
+from scipy import signal
+
+from eeg_pipeline import (
+    FEATURE_STAGES, SPECTRAL_MODES, PipelineConfig, apply_tolerance, compile_plan, create_hash_key
+)
+from eeg_recording import open_recording
+
+logger = logging.getLogger(__name__)
+
+# Samples per channel in one feature batch; the plan (and its buffers) is
+# compiled for one batch shape per configuration and reused for every recording
+BATCH_SAMPLES = 51200
+
+def parse_list(value, cast=float):
+    """Parse a comma-separated command line list"""
+    return [cast(item) for item in value.split(',') if item.strip()]
+
+def find_recordings(root):
+    """Return [(user, path)] for every .npy/.csv/.f32 recording under root"""
+    recordings = []
+    for user_dir in sorted(Path(root).iterdir()):
+        if not user_dir.is_dir():
+            continue
+        for path in sorted(user_dir.iterdir()):
+            if path.suffix in ('.npy', '.csv', '.f32'):
+                recordings.append((user_dir.name, str(path)))
+    return recordings
+
+def load_recording(path):
+    """Load a recording as an (n_samples, n_channels) float array"""
+    if path.endswith('.npy'):
+        return np.load(path, mmap_mode='r')
+    if path.endswith('.f32'):
+        with open(path[:-4] + '.json') as f:
+            meta = json.load(f)
+        meta['path'] = path
+        return open_recording(meta)
+    return np.loadtxt(path, delimiter=',', ndmin=2)
+
+def recording_channels(path):
+    """Channel count of a recording, without loading its samples"""
+    if path.endswith('.csv'):
+        with open(path) as f:
+            return len(f.readline().split(','))
+    return load_recording(path).shape[1]
+
+def resample(data, source_rate, target_rate):
+    """Polyphase-resample data along the time axis"""
+    if source_rate == target_rate:
+        return np.asarray(data, dtype=float)
+    ratio = Fraction(target_rate / source_rate).limit_denominator(1000)
+    return signal.resample_poly(np.asarray(data, dtype=float), ratio.numerator, ratio.denominator, axis=0)
+
+def evaluate_config(recordings, source_rate, window, rate, mode, tolerances, num_channels):
+    """Compute features once for one (window, rate, mode) and score every tolerance
+
+    Returns no results if no recording is at least one window long.
+    """
+    config = PipelineConfig(rate, num_channels, spectral_mode=mode)
+    window_size = int(rate * window)
+    batch_windows = max(1, BATCH_SAMPLES // window_size)
+    plan = compile_plan(config, FEATURE_STAGES, (num_channels, batch_windows, window_size))
+    batch = np.empty(plan.input_shape)
+
+    users = []
+    feature_vectors = []
+    feature_time = 0.0
+    for user, path in recordings:
+        data = resample(load_recording(path), source_rate, rate)
+        n_windows = len(data) // window_size
+        if n_windows == 0:
+            continue
+        # (num_channels, n_windows, window_size)
+        windows = data[:n_windows * window_size].T.reshape(num_channels, n_windows, window_size)
+        started = time.perf_counter()
+        for start in range(0, n_windows, batch_windows):
+            count = min(batch_windows, n_windows - start)
+            batch[:, :count] = windows[:, start:start + count]
+            batch[:, count:] = windows[:, start + count - 1:start + count]  # Pad with the last window
+            feature_vectors.extend(plan.run(batch)[:count])
+        feature_time += time.perf_counter() - started
+        users.extend([user] * n_windows)
+
+    if not feature_vectors:
+        return []
+
+    results = []
+    for tolerance in tolerances:
+        started = time.perf_counter()
+        keys = [create_hash_key(apply_tolerance(features, tolerance))
+                for features in feature_vectors]
+        key_time = time.perf_counter() - started
+
+        result = score_keys(users, keys)
+        windows = max(len(keys), 1)
+        result.update({
+            'tolerance': tolerance,
+            'window': window,
+            'sample_rate': rate,
+            'spectral_mode': mode,
+            'windows': len(keys),
+            'feature_ms_per_window': feature_time * 1000.0 / windows,
+            'key_ms_per_window': key_time * 1000.0 / windows
+        })
+        results.append(result)
+    return results
+
+def score_keys(users, keys):
+    """Key stability, FAR and FRR from exact key matches between windows"""
+    per_user = Counter(users)
+    per_key = Counter(keys)
+    per_user_key = Counter(zip(users, keys))
+
+    def pairs(n):
+        return n * (n - 1) // 2
+
+    genuine_pairs = sum(pairs(n) for n in per_user.values())
+    impostor_pairs = pairs(len(keys)) - genuine_pairs
+    genuine_matches = sum(pairs(n) for n in per_user_key.values())
+    impostor_matches = sum(pairs(n) for n in per_key.values()) - genuine_matches
+
+    stability = genuine_matches / genuine_pairs if genuine_pairs else 0.0
+    return {
+        'key_stability': stability,
+        'frr': 1.0 - stability if genuine_pairs else 0.0,
+        'far': impostor_matches / impostor_pairs if impostor_pairs else 0.0
+    }
+
+def run_sweep(recordings, source_rate, tolerances, windows, rates, modes, num_channels, workers=None):
+    """Evaluate the full grid over a process pool"""
+    configs = list(itertools.product(windows, rates, modes))
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(evaluate_config, recordings, source_rate, window, rate, mode, tolerances, num_channels)
+            for window, rate, mode in configs
+        ]
+        for future in futures:
+            results.extend(future.result())
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Sweep BrainAuth key parameters over labelled recordings')
+    parser.add_argument('recordings', help='Directory with one sub-directory of recordings per user')
+    parser.add_argument('--source-rate', type=float, default=100.0, help='Sample rate of the recordings (Hz)')
+    parser.add_argument('--channels', type=int,
+                        help='Channel count of the recordings (default: that of the first recording)')
+    parser.add_argument('--tolerances', default='5,10,15,20,25', help='Tolerance percentages')
+    parser.add_argument('--windows', default='1,2,4', help='Window lengths (seconds)')
+    parser.add_argument('--rates', default='100', help='Processing sample rates (Hz)')
+    parser.add_argument('--modes', default=','.join(SPECTRAL_MODES), help='Spectral modes')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Process pool size')
+    parser.add_argument('--output', help='Write results to a .json or .csv file')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    recordings = find_recordings(args.recordings)
+    if not recordings:
+        logger.error("No recordings found in %s", args.recordings)
+        sys.exit(1)
+
+    num_channels = args.channels or recording_channels(recordings[0][1])
+    matching = []
+    for user, path in recordings:
+        channels = recording_channels(path)
+        if channels == num_channels:
+            matching.append((user, path))
+        else:
+            logger.warning("Skipping %s: %d channels, expected %d", path, channels, num_channels)
+    if not matching:
+        logger.error("No recordings with %d channels in %s", num_channels, args.recordings)
+        sys.exit(1)
+    recordings = matching
+
+    results = run_sweep(
+        recordings,
+        args.source_rate,
+        parse_list(args.tolerances),
+        parse_list(args.windows),
+        parse_list(args.rates),
+        parse_list(args.modes, str),
+        num_channels,
+        args.workers
+    )
+    if not results:
+        logger.error("No configuration produced results (are the recordings shorter than every window?)")
+        sys.exit(1)
+    results.sort(key=lambda r: (r['far'] + r['frr'], r['feature_ms_per_window']))
+
+    print(f"{'tol%':>6} {'window':>7} {'rate':>6} {'mode':>6} {'stability':>10} "
+          f"{'FAR':>8} {'FRR':>8} {'feat ms':>8} {'key ms':>8}")
+    for r in results:
+        print(f"{r['tolerance']:>6.1f} {r['window']:>7.2f} {r['sample_rate']:>6.0f} {r['spectral_mode']:>6} "
+              f"{r['key_stability']:>10.3f} {r['far']:>8.4f} {r['frr']:>8.4f} "
+              f"{r['feature_ms_per_window']:>8.2f} {r['key_ms_per_window']:>8.2f}")
+
+    if args.output:
+        if args.output.endswith('.csv'):
+            with open(args.output, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+                writer.writeheader()
+                writer.writerows(results)
+        else:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
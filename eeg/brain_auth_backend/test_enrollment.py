@@ -0,0 +1,54 @@
+"""
+BrainID Neural Authentication System
+Enrollment Template Tests
+
+    python -m pytest test_enrollment.py
+"""
+
+import unittest
+
+import numpy as np
+
+from eeg_enrollment import RunningStats, UserTemplate
+from eeg_pipeline import create_hash_key
+
+NUM_FEATURES = 64
+
+def enroll(user_mean, noise, rng, windows=60):
+    """Template built from noisy windows around user_mean"""
+    stats = RunningStats(NUM_FEATURES)
+    stats.update(user_mean + noise * rng.standard_normal((windows, NUM_FEATURES)))
+    return UserTemplate.from_stats('user', stats, {}, tolerance_sigmas=3.0, min_width=0.15)
+
+class UserTemplateKeyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+        self.means = [self.rng.normal(size=NUM_FEATURES) for _ in range(2)]
+        self.templates = [enroll(mean, 0.02, self.rng) for mean in self.means]
+
+    def key(self, template, features):
+        return create_hash_key(template.quantize(features))
+
+    def test_matching_features_give_a_stable_key(self):
+        for template, mean in zip(self.templates, self.means):
+            keys = {self.key(template, mean + 0.02 * self.rng.standard_normal(NUM_FEATURES)) for _ in range(20)}
+            self.assertEqual(len(keys), 1)
+
+    def test_users_get_different_keys(self):
+        keys = [self.key(template, mean) for template, mean in zip(self.templates, self.means)]
+        self.assertNotEqual(keys[0], keys[1])
+
+    def test_key_is_not_the_all_zero_bins_key(self):
+        zero_key = create_hash_key(np.zeros(NUM_FEATURES))
+        for template, mean in zip(self.templates, self.means):
+            self.assertNotEqual(self.key(template, mean), zero_key)
+
+    def test_template_key_does_not_unlock_another_user(self):
+        self.assertNotEqual(
+            self.key(self.templates[0], self.means[0]),
+            self.key(self.templates[0], self.means[1])
+        )
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,190 @@
+"""
+BrainID Neural Authentication System
+Key Pipeline Regression Tests
+
+Keys from the compiled pipeline must stay bit-identical to the original
+per-channel, per-band key code, or enrolled users can no longer log in.
+baseline_key below is that code, kept as it was; do not "fix" it.
+
+    python -m pytest test_pipeline.py
+"""
+
+import base64
+import hashlib
+import os
+import unittest
+
+import numpy as np
+from scipy import signal
+from scipy.fft import fft, fftfreq
+
+from eeg_pipeline import KEY_STAGES, PipelineConfig, compile_plan
+from eeg_resampling import StreamingResampler
+
+# The server module picks its concurrency model on import
+os.environ.setdefault('BRAIN_AUTH_ASYNC_MODE', 'threading')
+from brain_auth_server import decode_sample_block, encode_sample_block  # noqa: E402
+
+BASELINE_BANDS = {
+    'delta': (0.5, 4.0),
+    'theta': (4.0, 8.0),
+    'alpha': (8.0, 12.0),
+    'beta': (12.0, 30.0),
+    'gamma': (30.0, 50.0)
+}
+
+def baseline_key(channels, sample_rate, tolerance_percentage=15.0):
+    """Key of one (num_channels, n_samples) window, computed as the original server did"""
+    all_features = []
+    for channel_data in channels:
+        for low_freq, high_freq in BASELINE_BANDS.values():
+            nyquist = sample_rate / 2
+            try:
+                b, a = signal.butter(4, [low_freq / nyquist, high_freq / nyquist], btype='band')
+                band_data = signal.filtfilt(b, a, channel_data)
+            except Exception:
+                band_data = channel_data
+
+            fft_values = fft(band_data)
+            fft_freqs = fftfreq(len(band_data), 1 / sample_rate)
+            positive_freqs = fft_freqs[:len(fft_freqs) // 2]
+            fft_magnitude = np.abs(fft_values[:len(fft_values) // 2])
+
+            total_power = np.sum(fft_magnitude)
+            rolloff_idx = np.where(np.cumsum(fft_magnitude) >= 0.85 * total_power)[0]
+            rolloff = positive_freqs[rolloff_idx[0]] if len(rolloff_idx) > 0 else positive_freqs[-1]
+
+            all_features.extend([
+                np.mean(fft_magnitude),
+                positive_freqs[np.argmax(fft_magnitude)],
+                np.max(fft_magnitude),
+                np.sum(fft_magnitude[:10]) / np.sum(fft_magnitude),
+                np.sum(positive_freqs * fft_magnitude) / np.sum(fft_magnitude),
+                rolloff,
+                np.sum(np.diff(fft_magnitude) ** 2)
+            ])
+
+    features = np.nan_to_num(np.array(all_features), nan=0.0, posinf=1e6, neginf=-1e6)
+    mean = np.mean(features)
+    std = np.std(features)
+    if std > 0:
+        features = (features - mean) / std
+
+    scale_factor = 100.0 / tolerance_percentage
+    features = np.round(features * scale_factor) / scale_factor
+
+    feature_bytes = features.tobytes()
+    hash_layers = [
+        hashlib.sha256(feature_bytes).digest(),
+        hashlib.md5(feature_bytes).digest(),
+        hashlib.sha1(feature_bytes).digest(),
+        hashlib.sha512(feature_bytes).digest()[:64],
+        hashlib.blake2b(feature_bytes, digest_size=32).digest()
+    ]
+    for i in range(0, len(features), 10):
+        hash_layers.append(hashlib.sha256(features[i:i + 10].tobytes()).digest())
+    combined_hash = b''.join(hash_layers)
+    if len(combined_hash) > 2048:
+        combined_hash = combined_hash[:2048]
+    elif len(combined_hash) < 2048:
+        while len(combined_hash) < 2048:
+            combined_hash += hashlib.sha256(combined_hash).digest()
+        combined_hash = combined_hash[:2048]
+    return base64.b64encode(combined_hash).decode('utf-8')
+
+def eeg_window(num_channels, n_samples, sample_rate, seed):
+    """Synthetic (num_channels, n_samples) EEG: per-channel rhythms plus noise"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(n_samples) / sample_rate
+    freqs = rng.uniform(1.0, sample_rate / 2.5, size=(num_channels, 1))
+    return 20.0 * np.sin(2 * np.pi * freqs * t) + 5.0 * rng.standard_normal((num_channels, n_samples))
+
+class GoldenKeyTest(unittest.TestCase):
+
+    def check(self, sample_rate, num_channels, tolerance=15.0, seeds=range(3)):
+        n_samples = int(sample_rate * 2.0)  # The server's 2 s key window
+        config = PipelineConfig(sample_rate, num_channels, tolerance_percentage=tolerance)
+        plan = compile_plan(config, KEY_STAGES, (num_channels, n_samples))
+        for seed in seeds:
+            channels = eeg_window(num_channels, n_samples, sample_rate, seed)
+            with self.subTest(seed=seed):
+                self.assertEqual(plan.run(channels), baseline_key(channels, sample_rate, tolerance))
+
+    def test_20_hz_8_channels(self):
+        self.check(20.0, 8)
+
+    def test_20_hz_16_channels(self):
+        self.check(20.0, 16)
+
+    def test_100_hz_8_channels(self):
+        self.check(100.0, 8)
+
+    def test_100_hz_16_channels(self):
+        self.check(100.0, 16)
+
+    def test_other_tolerance(self):
+        self.check(100.0, 8, tolerance=10.0)
+
+    def test_repeated_runs_of_a_cached_plan(self):
+        # Plans reuse their buffers; a second run must not see the first one's data
+        self.check(100.0, 8, seeds=[5, 6, 5])
+
+class StreamingResamplerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.samples = np.random.default_rng(0).standard_normal((1000, 4))
+
+    def check_streamed(self, input_rate, output_rate, block_sizes):
+        one_shot = StreamingResampler(input_rate, output_rate, 4).process(self.samples)
+        resampler = StreamingResampler(input_rate, output_rate, 4)
+        blocks = []
+        start = 0
+        for size in block_sizes:
+            blocks.append(resampler.process(self.samples[start:start + size]))
+            start += size
+        blocks.append(resampler.process(self.samples[start:]))
+        np.testing.assert_allclose(np.concatenate(blocks), one_shot, rtol=0, atol=1e-12)
+
+    def test_downsampling_in_blocks(self):
+        self.check_streamed(250.0, 100.0, [1, 7, 64, 3, 200])
+
+    def test_upsampling_one_sample_at_a_time(self):
+        self.check_streamed(100.0, 250.0, [1] * 300)
+
+    def test_state_round_trip(self):
+        one_shot = StreamingResampler(250.0, 100.0, 4).process(self.samples)
+        first = StreamingResampler(250.0, 100.0, 4)
+        head = first.process(self.samples[:333])
+        resumed = StreamingResampler(250.0, 100.0, 4)
+        resumed.set_state(first.get_state())
+        tail = resumed.process(self.samples[333:])
+        np.testing.assert_allclose(np.concatenate([head, tail]), one_shot, rtol=0, atol=1e-12)
+
+    def test_equal_rates_pass_through(self):
+        np.testing.assert_array_equal(StreamingResampler(100.0, 100.0, 4).process(self.samples), self.samples)
+
+class SampleBlockTest(unittest.TestCase):
+
+    def test_round_trip_within_resolution(self):
+        samples = 50.0 * np.random.default_rng(0).standard_normal((300, 8))
+        decoded = decode_sample_block(encode_sample_block(samples))
+        self.assertEqual(decoded.shape, samples.shape)
+        np.testing.assert_allclose(decoded, np.round(samples / 0.01) * 0.01, rtol=0, atol=1e-9)
+
+    def test_smooth_signals_use_narrow_dtypes(self):
+        t = np.arange(200)[:, None] / 100.0
+        block = encode_sample_block(np.sin(2 * np.pi * t) + np.zeros((1, 8)))
+        self.assertEqual(block['dtype'], 'uint8')
+
+    def test_large_steps_widen_the_dtype(self):
+        samples = np.array([[0.0], [1e6], [-1e6]])
+        block = encode_sample_block(samples, resolution=1.0)
+        self.assertEqual(block['dtype'], 'uint32')
+        np.testing.assert_array_equal(decode_sample_block(block), samples)
+
+    def test_empty_block(self):
+        decoded = decode_sample_block(encode_sample_block(np.empty((0, 8))))
+        self.assertEqual(decoded.shape, (0, 8))
+
+if __name__ == "__main__":
+    unittest.main()
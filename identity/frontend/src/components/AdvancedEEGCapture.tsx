@@ -4,6 +4,7 @@ import React, { useState, useEffect, useRef } from 'react'
 import { Brain, Activity, Zap, CheckCircle, AlertCircle, Signal, Loader2, Wifi, WifiOff, Database, Settings, ArrowRight, Copy } from 'lucide-react'
 import { toast } from 'react-hot-toast'
 import { io, Socket } from 'socket.io-client'
+import { decodeSampleBlock, SampleBlock } from '@/utils/sampleBlock'
 
 interface AdvancedEEGCaptureProps {
     onComplete: (result: any) => void
@@ -72,6 +73,11 @@ export default function AdvancedEEGCapture({ onComplete }: AdvancedEEGCapturePro
     // Socket.IO reference
     const socketRef = useRef<Socket | null>(null)
 
+    // Read by the polling interval, which only sees the first render's state
+    const deviceRef = useRef<string | null>(null)
+    const lastSeqRef = useRef<number | null>(null)
+    const blockPendingRef = useRef(false)
+
     // Initialize Socket.IO connection
     useEffect(() => {
         // Connect to Flask Socket.IO server
@@ -85,14 +91,19 @@ export default function AdvancedEEGCapture({ onComplete }: AdvancedEEGCapturePro
 
         socketRef.current.on('disconnect', () => {
             console.log('Disconnected from Flask Socket.IO server')
+            // A block requested before the drop will never arrive
+            blockPendingRef.current = false
         })
 
         socketRef.current.on('esp32_status', (data) => {
             console.log('ESP32 status update:', data)
             if (data.status === 'connected') {
+                deviceRef.current = data.device_id ?? null
+                lastSeqRef.current = null
                 setStatus(prev => ({ ...prev, esp32Connected: true }))
                 setProgress(0)
-            } else if (data.status === 'disconnected') {
+            } else if (data.status === 'disconnected' && (!data.device_id || data.device_id === deviceRef.current)) {
+                deviceRef.current = null
                 setStatus(prev => ({ ...prev, esp32Connected: false, bufferReady: false }))
                 setProgress(0)
             }
@@ -111,10 +122,43 @@ export default function AdvancedEEGCapture({ onComplete }: AdvancedEEGCapturePro
             }
         })
 
-        // Request real-time data when connected
+        socketRef.current.on('eeg_data_block', async (block: SampleBlock & { status?: string, message?: string }) => {
+            try {
+                if (block.status === 'error') {
+                    console.warn('EEG data request failed:', block.message)
+                    return
+                }
+                if (block.device_id !== deviceRef.current) return
+
+                const samples = await decodeSampleBlock(block)
+                lastSeqRef.current = block.last_seq
+                setStatus(prev => ({ ...prev, bufferReady: block.buffer_ready, sampleRate: block.sample_rate }))
+
+                const latest = samples[samples.length - 1]
+                if (latest) {
+                    setChannelData(prev =>
+                        prev.map((channel, index) => {
+                            const newValue = latest[index] || 0
+                            const active = Math.abs(newValue) > 10
+                            return { ...channel, value: newValue, active }
+                        })
+                    )
+                }
+            } catch (error) {
+                console.error('Failed to decode EEG data block:', error)
+            } finally {
+                blockPendingRef.current = false
+            }
+        })
+
+        // Request real-time data when connected, one block in flight at a time
         const interval = setInterval(() => {
-            if (status.esp32Connected && socketRef.current) {
-                socketRef.current.emit('request_eeg_data')
+            if (deviceRef.current && socketRef.current && !blockPendingRef.current) {
+                blockPendingRef.current = true
+                socketRef.current.emit('request_eeg_data', {
+                    device: deviceRef.current,
+                    last_seq: lastSeqRef.current
+                })
             }
         }, 100) // 100ms = 10Hz update rate
 
@@ -185,6 +229,8 @@ export default function AdvancedEEGCapture({ onComplete }: AdvancedEEGCapturePro
 
     // Disconnect from ESP32
     const disconnectESP32 = () => {
+        deviceRef.current = null
+        lastSeqRef.current = null
         setStatus({
             esp32Connected: false,
             bufferReady: false,
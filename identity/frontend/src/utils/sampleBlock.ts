@@ -0,0 +1,61 @@
+// Decoder for the eeg_data_block events sent by the BrainAuth server
+// (see "Sample blocks" in eeg/brain_auth_backend/README_BRAIN_AUTH.md)
+
+export interface SampleBlock {
+    shape: [number, number]
+    dtype: 'uint8' | 'uint16' | 'uint32' | 'uint64'
+    resolution: number
+    data: ArrayBuffer | Uint8Array
+    device_id: string
+    first_seq: number
+    last_seq: number
+    snapshot: boolean
+    sample_rate: number
+    buffer_ready: boolean
+}
+
+const dtypeBytes = { uint8: 1, uint16: 2, uint32: 4, uint64: 8 }
+
+// data is zlib-wrapped deflate, which DecompressionStream calls 'deflate'
+async function inflate(data: ArrayBuffer | Uint8Array): Promise<ArrayBuffer> {
+    const stream = new Blob([data]).stream().pipeThrough(new DecompressionStream('deflate'))
+    return new Response(stream).arrayBuffer()
+}
+
+function readDelta(view: DataView, offset: number, dtype: SampleBlock['dtype']): number {
+    if (dtype === 'uint64') {
+        const zigzag = view.getBigUint64(offset, true)
+        return Number((zigzag >> BigInt(1)) ^ -(zigzag & BigInt(1)))
+    }
+    const zigzag = dtype === 'uint8' ? view.getUint8(offset)
+        : dtype === 'uint16' ? view.getUint16(offset, true)
+        : view.getUint32(offset, true)
+    return (zigzag >>> 1) ^ -(zigzag & 1)
+}
+
+// Returns the block's samples as [n_samples][n_channels] values in μV
+export async function decodeSampleBlock(block: SampleBlock): Promise<number[][]> {
+    const [nSamples, nChannels] = block.shape
+    const width = dtypeBytes[block.dtype]
+    if (!width) {
+        throw new Error(`Unsupported sample block dtype: ${block.dtype}`)
+    }
+
+    const view = new DataView(await inflate(block.data))
+    if (view.byteLength !== nSamples * nChannels * width) {
+        throw new Error('Sample block size does not match its shape')
+    }
+
+    // Deltas run along time per channel, the first row against zero
+    const running = new Array(nChannels).fill(0)
+    const samples: number[][] = []
+    for (let i = 0; i < nSamples; i++) {
+        const row = new Array(nChannels)
+        for (let c = 0; c < nChannels; c++) {
+            running[c] += readDelta(view, (i * nChannels + c) * width, block.dtype)
+            row[c] = running[c] * block.resolution
+        }
+        samples.push(row)
+    }
+    return samples
+}